@@ -5,7 +5,11 @@ from dotenv import load_dotenv
 import os
 import secrets
 import logging
-from routes import init_socketio
+from routes import init_socketio, socketio
+from cache import init_cache
+from http_client import init_http_client
+from jobs import init_jobs
+from canvas_sync import init_canvas_sync
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,16 +22,46 @@ def create_app():
     
     # Configure app
     app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(16))
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///calendar.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///calendar.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # 'lru' keeps feeds in each worker; 'kv' shares them through a local SQLite file
+    app.config['FEED_CACHE_TYPE'] = os.getenv('FEED_CACHE_TYPE', 'lru')
+    app.config['FEED_CACHE_PATH'] = os.getenv('FEED_CACHE_PATH', os.path.join(app.instance_path, 'feed_cache.db'))
+    app.config['FEED_CACHE_TTL'] = int(os.getenv('FEED_CACHE_TTL', 300))
+    # Background Canvas refresh; run at most one syncing process per deployment
+    app.config['CANVAS_SYNC_ENABLED'] = os.getenv('CANVAS_SYNC_ENABLED') == '1'
+    app.config['CANVAS_SYNC_INTERVAL'] = int(os.getenv('CANVAS_SYNC_INTERVAL', 3600))
+    app.config['CANVAS_SYNC_CONCURRENCY'] = int(os.getenv('CANVAS_SYNC_CONCURRENCY', 4))
+    app.config['CANVAS_SYNC_FETCH_JITTER'] = float(os.getenv('CANVAS_SYNC_FETCH_JITTER', 5))
+    # 'thread' runs background jobs in this process; 'local' shares them through a SQLite broker file
+    app.config['JOB_QUEUE_TYPE'] = os.getenv('JOB_QUEUE_TYPE', 'thread')
+    app.config['JOB_BROKER_PATH'] = os.getenv('JOB_BROKER_PATH', os.path.join(app.instance_path, 'jobs.db'))
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))  # 0 leaves jobs to 'flask jobs-worker'
+    # Outbound HTTP (Canvas feeds); the pool should cover the sync concurrency
+    app.config['HTTP_CONNECT_TIMEOUT'] = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    app.config['HTTP_READ_TIMEOUT'] = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+    app.config['HTTP_RETRIES'] = int(os.getenv('HTTP_RETRIES', 2))
+    app.config['HTTP_POOL_SIZE'] = int(os.getenv('HTTP_POOL_SIZE', 10))
+    app.config['HTTP_MAX_RESPONSE_SIZE'] = int(os.getenv('HTTP_MAX_RESPONSE_SIZE', 10 * 1024 * 1024))
+    # Required with more than one server process: a redis:// (or other queue) URL,
+    # or 'local' for a SQLite queue shared by processes on this host
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    app.config['SOCKETIO_QUEUE_PATH'] = os.getenv('SOCKETIO_QUEUE_PATH', os.path.join(app.instance_path, 'socketio.db'))
+    # eventlet or gevent only in processes that monkey-patched first (serve.py sets it);
+    # left to Flask-SocketIO, an installed eventlet would be picked unpatched
+    app.config['SOCKETIO_ASYNC_MODE'] = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
 
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    init_cache(app)
+    init_http_client(app)
+    init_jobs(app)
+    init_canvas_sync(app)
 
-    socketio = init_socketio(app)
+    init_socketio(app)
 
     # Register blueprints
     from routes import (
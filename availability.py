@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from scheduler import DAY_START, DAY_END
+
+# Availability is tracked in 15-minute slots, one bit per slot
+SLOT = timedelta(minutes=15)
+
+
+def slot_count(start, end):
+    return int((end - start) / SLOT)
+
+
+def busy_bitmap(intervals, start, slots):
+    """Python int with bit i set when slot i after `start` overlaps an interval."""
+    bits = 0
+    for busy_start, busy_end in intervals:
+        first = max(0, int((busy_start - start) / SLOT))
+        # Round the end up so partially covered slots count as busy
+        last = min(slots, -int(-(busy_end - start) // SLOT))
+        if last > first:
+            bits |= ((1 << (last - first)) - 1) << first
+    return bits
+
+
+def waking_hours_mask(start, slots, day_start=DAY_START, day_end=DAY_END):
+    """Bits set for slots that fall within each day's waking hours."""
+    mask = 0
+    day = start.date()
+    while True:
+        open_at = datetime.combine(day, day_start)
+        close_at = datetime.combine(day, day_end)
+        if open_at - start >= slots * SLOT:
+            break
+        mask |= busy_bitmap([(open_at, close_at)], start, slots)
+        day += timedelta(days=1)
+    return mask
+
+
+def common_free_bitmap(busy_by_user, start, end, waking_only=True):
+    """AND every member's free bitmap over [start, end)."""
+    slots = slot_count(start, end)
+    free = (1 << slots) - 1
+    if waking_only:
+        free &= waking_hours_mask(start, slots)
+    for intervals in busy_by_user.values():
+        free &= ~busy_bitmap(intervals, start, slots)
+        if not free:
+            break
+    return free
+
+
+def free_ranges(bits, start, min_slots=1):
+    """Runs of set bits as (start, end) datetimes, keeping runs of at least `min_slots`."""
+    ranges = []
+    offset = 0
+    while bits:
+        # Skip to the next free slot, then measure the run of free slots
+        skip = (bits & -bits).bit_length() - 1
+        bits >>= skip
+        offset += skip
+        run = (~bits & (bits + 1)).bit_length() - 1
+        if run >= min_slots:
+            ranges.append((start + offset * SLOT, start + (offset + run) * SLOT))
+        bits >>= run
+        offset += run
+    return ranges
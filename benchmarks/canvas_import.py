@@ -0,0 +1,160 @@
+"""
+End-to-end Canvas import benchmark: synthetic feeds are served from a
+local HTTP server and imported into a scratch SQLite database.
+
+    python benchmarks/canvas_import.py --events 2000 --courses 8
+    python benchmarks/canvas_import.py --json > baseline.json
+    python benchmarks/canvas_import.py --check baseline.json
+
+--check exits non-zero when a scenario gets more than --tolerance slower
+(events/sec) or issues more SQL statements than the baseline.
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Configure the app before it is imported
+SCRATCH = tempfile.mkdtemp(prefix='timely-bench-')
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'bench.db')
+os.environ.pop('CANVAS_SYNC_ENABLED', None)
+
+from sqlalchemy import event as sa_event
+from app import app
+from extensions import db
+from models import User
+from utils import fetch_canvas_courses, fetch_canvas_events, import_canvas_feed
+from feeds import synthetic_feed, FeedServer
+
+# Per-import INFO lines would drown the report
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def fresh_user():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    user = User(username='bench', email='bench@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def reimport(url, user):
+    # Cold import, then the scenario under test: the same body again
+    import_canvas_feed(url, user)
+    user.canvas_etag = user.canvas_last_modified = user.canvas_content_hash = None
+    db.session.commit()
+    return lambda: import_canvas_feed(url, user)
+
+
+SCENARIOS = {
+    'fetch_canvas_courses': lambda url, user: lambda: fetch_canvas_courses(url, user),
+    'fetch_canvas_events': lambda url, user: lambda: fetch_canvas_events(url, user),
+    'import_canvas_feed': lambda url, user: lambda: import_canvas_feed(url, user),
+    'import_canvas_feed (unchanged)': reimport,
+}
+
+
+def run(name, url, events, trace=False):
+    user = fresh_user()
+    action = SCENARIOS[name](url, user)
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    sa_event.listen(db.engine, 'before_cursor_execute', count)
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        if not action():
+            raise RuntimeError(f'{name} failed')
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+        sa_event.remove(db.engine, 'before_cursor_execute', count)
+
+    return {
+        'seconds': round(elapsed, 4),
+        'events_per_sec': round(events / elapsed, 1),
+        'sql': len(statements),
+        'peak_mib': round(peak / 2**20, 2) if peak is not None else None
+    }
+
+
+def benchmark(args):
+    feed = synthetic_feed(args.events, courses=args.courses,
+                          description_size=args.description_size, bracketed=args.bracketed)
+    results = {}
+    with FeedServer({'/feed.ics': feed}) as server, app.app_context():
+        url = server.url('/feed.ics')
+        for name in SCENARIOS:
+            timings = [run(name, url, args.events) for _ in range(args.repeat)]
+            best = min(timings, key=lambda r: r['seconds'])
+            # Memory is traced in its own run; tracing skews timings
+            best['peak_mib'] = run(name, url, args.events, trace=True)['peak_mib']
+            results[name] = best
+    return {'feed_bytes': len(feed), 'events': args.events, 'courses': args.courses,
+            'scenarios': results}
+
+
+def regressions(results, baseline, tolerance):
+    problems = []
+    for name, result in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            continue
+        if result['events_per_sec'] < before['events_per_sec'] * (1 - tolerance):
+            problems.append(f"{name}: {result['events_per_sec']} events/s, "
+                            f"baseline {before['events_per_sec']}")
+        if result['sql'] > before['sql']:
+            problems.append(f"{name}: {result['sql']} SQL statements, baseline {before['sql']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=6)
+    parser.add_argument('--description-size', type=int, default=200)
+    parser.add_argument('--bracketed', type=float, default=0.5,
+                        help='Share of summaries with a [ABC-123] course tag.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+    parser.add_argument('--check', metavar='BASELINE', help='Fail on regressions against a --json baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Feed: {results['feed_bytes'] / 2**20:.1f} MiB, {args.events} VEVENTs, "
+              f"{args.courses} courses")
+        for name, r in results['scenarios'].items():
+            print(f"{name:<32} {r['seconds']:8.3f} s  {r['events_per_sec']:10.0f} events/s  "
+                  f"{r['sql']:5d} SQL  peak {r['peak_mib']:7.1f} MiB")
+
+    if args.check:
+        with open(args.check) as f:
+            problems = regressions(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION {problem}', file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Synthetic Canvas-style iCal feeds and a local HTTP server to serve them."""
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ('review', 'submit', 'chapter', 'problems', 'lab', 'report', 'draft', 'reading',
+         'quiz', 'section', 'outline', 'peer', 'discussion', 'project', 'notes', 'module')
+
+
+def course_codes(count):
+    return [f'{"CSE MAT PHY ENG BIO CHM".split()[i % 6]}-{100 + i}' for i in range(count)]
+
+
+def synthetic_feed(events=1000, courses=6, description_size=200, bracketed=0.5,
+                   start=datetime(2022, 8, 20, 23, 59), seed=1):
+    """
+    Canvas-style feed spread over several years. A `bracketed` share of
+    summaries carry the course as '[ABC-123]'; the rest name it only in
+    a 'Course:' line of the description, padded to `description_size`.
+    """
+    rng = random.Random(seed)
+    codes = course_codes(courses)
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Benchmark//Canvas Feed//EN',
+             'X-WR-CALNAME:Benchmark']
+    for i in range(events):
+        course = codes[i % len(codes)]
+        due = start + timedelta(hours=7 * i)
+        summary = f'Assignment {i}'
+        if rng.random() < bracketed:
+            summary += f' [{course}]'
+        text = f'Course: {course} Section 001\\n'
+        while len(text) < description_size:
+            text += rng.choice(WORDS) + ' '
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:event-assignment-{i}',
+            f'DTSTAMP:{due:%Y%m%dT%H%M%S}Z',
+            f'DTSTART:{due:%Y%m%dT%H%M%S}Z',
+            f'SUMMARY:{summary}',
+            f'DESCRIPTION:{text[:description_size]}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(fold(line) for line in lines) + '\r\n').encode()
+
+
+def fold(line, limit=75):
+    # Feeds in the wild fold long lines; keep the parser honest
+    if len(line) <= limit:
+        return line
+    chunks = [line[:limit]] + [line[i:i + limit - 1] for i in range(limit, len(line), limit - 1)]
+    return '\r\n '.join(chunks)
+
+
+class FeedServer:
+    """Serves {path: body} on 127.0.0.1 with ETag revalidation; counts requests."""
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like a real host
+
+            def do_GET(self):
+                server.requests += 1
+                body = server.feeds.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = f'"{len(body)}-{hash(body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/calendar')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,46 @@
+"""
+Compare the icalendar-based parser with the streaming parser on a
+synthetic Canvas feed.
+
+    python benchmarks/ical_parse.py --events 5000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import parse_ical_data, iter_canvas_events
+from feeds import synthetic_feed
+
+
+def measure(label, func, feed):
+    # Time and memory are measured in separate runs; tracing skews timings
+    started = time.perf_counter()
+    count = func(feed)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func(feed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<28} {count:>7} events  {elapsed:8.3f} s  '
+          f'{count / elapsed:10.0f} events/s  peak {peak / 2**20:8.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=5000)
+    args = parser.parse_args()
+
+    feed = synthetic_feed(args.events, description_size=120)
+    print(f'Feed: {len(feed) / 2**20:.1f} MiB, {args.events} VEVENTs')
+    measure('icalendar (parse_ical_data)', lambda body: len(parse_ical_data(body)), feed)
+    measure('streaming, materialized', lambda body: len(list(iter_canvas_events(body))), feed)
+    measure('streaming, consumed lazily', lambda body: sum(1 for _ in iter_canvas_events(body)), feed)
+
+
+if __name__ == '__main__':
+    main()
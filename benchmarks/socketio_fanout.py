@@ -0,0 +1,210 @@
+"""
+Socket.IO fan-out load test: starts several server processes sharing a
+message queue, connects clients spread across them and has each one
+chat with a user connected to a different process.
+
+    python benchmarks/socketio_fanout.py --workers 4 --clients 20 --messages 10
+    python benchmarks/socketio_fanout.py --queue none --timeout 5   # emits lost between workers
+
+Workers run on eventlet or gevent like serve.py, or on the development
+server with --allow-werkzeug. Exits non-zero when any message is not
+delivered.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# First: in the spawned workers this applies serve.py's monkey-patching
+import serve
+
+import argparse
+import atexit
+import json
+import shutil
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Worker on port {port} did not start')
+
+
+def configure(args):
+    # Set before the app is imported here and inherited by the spawned workers
+    scratch = tempfile.mkdtemp(prefix='timely-fanout-')
+    atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch, 'fanout.db')
+    os.environ['FLASK_SECRET_KEY'] = 'fanout-benchmark'
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ.pop('CANVAS_SYNC_ENABLED', None)
+    if args.queue == 'none':
+        os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+    else:
+        os.environ['SOCKETIO_MESSAGE_QUEUE'] = args.queue
+        os.environ['SOCKETIO_QUEUE_PATH'] = os.path.join(scratch, 'socketio.db')
+
+
+def create_users(count):
+    from app import app
+    from extensions import db
+    from models import User
+
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f'load{i}', email=f'load{i}@example.com', password='x')
+                 for i in range(count)]
+        db.session.add_all(users)
+        db.session.commit()
+        # Signed session cookies, as the login view would have set them
+        serializer = app.session_interface.get_signing_serializer(app)
+        cookie = app.config['SESSION_COOKIE_NAME']
+        return [(user.id, f'{cookie}={serializer.dumps({"user_id": user.id})}') for user in users]
+
+
+class LoadClient:
+    """One logged-in browser: a Socket.IO connection to one worker."""
+
+    def __init__(self, user_id, cookie, port, results):
+        import socketio
+        self.user_id = user_id
+        self.port = port
+        self.results = results
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('new_message', self.on_message)
+        self.sio.connect(f'http://127.0.0.1:{port}', headers={'Cookie': cookie},
+                         transports=['polling'], wait_timeout=10)
+
+    def on_message(self, message):
+        # Senders get their own message back from their room; count only deliveries
+        if message['sender_id'] != self.user_id:
+            self.results.delivered(message['content'])
+
+    def send(self, recipient_id, content):
+        self.sio.emit('send_message', {'recipient_id': recipient_id, 'content': content})
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.latencies = []
+        self.done = threading.Event()
+        self.expected = 0
+
+    def sending(self, content):
+        with self.lock:
+            self.sent[content] = time.perf_counter()
+
+    def delivered(self, content):
+        with self.lock:
+            started = self.sent.get(content)
+            if started is None:
+                return
+            self.latencies.append(time.perf_counter() - started)
+            if len(self.latencies) == self.expected:
+                self.done.set()
+
+
+def load_test(args):
+    mode = serve.async_mode(args.allow_werkzeug)
+    users = create_users(args.clients)
+    ports = [free_port() for _ in range(args.workers)]
+    workers = [serve.start(serve.run_worker, '127.0.0.1', port, mode, 'WARNING', False,
+                           name=f'fanout-{port}', patch=mode)
+               for port in ports]
+    try:
+        for port in ports:
+            wait_for_port(port)
+
+        results = Results()
+        clients = [LoadClient(user_id, cookie, ports[i % len(ports)], results)
+                   for i, (user_id, cookie) in enumerate(users)]
+        # Let every client's connect handler join its user room
+        time.sleep(0.5)
+
+        results.expected = args.clients * args.messages
+        started = time.perf_counter()
+        for n in range(args.messages):
+            for i, client in enumerate(clients):
+                # The next user is connected to the next worker along
+                recipient = clients[(i + 1) % len(clients)]
+                content = f'{client.user_id}:{n}'
+                results.sending(content)
+                client.send(recipient.user_id, content)
+            time.sleep(args.interval)
+        results.done.wait(args.timeout)
+        elapsed = time.perf_counter() - started
+
+        for client in clients:
+            client.sio.disconnect()
+    finally:
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
+
+    latencies = sorted(results.latencies)
+    return {
+        'workers': args.workers,
+        'async_mode': mode,
+        'clients': args.clients,
+        'queue': args.queue,
+        'sent': results.expected,
+        'delivered': len(latencies),
+        'lost': results.expected - len(latencies),
+        'messages_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=12)
+    parser.add_argument('--messages', type=int, default=10, help='Messages per client.')
+    # All clients share this process; sending faster than it can poll measures the backlog
+    parser.add_argument('--interval', type=float, default=0.5, help='Seconds between rounds of sends.')
+    parser.add_argument('--queue', default='local',
+                        help="SOCKETIO_MESSAGE_QUEUE for the workers, or 'none'.")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--allow-werkzeug', action='store_true',
+                        help='Run the workers on the development server without eventlet or gevent.')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+    args = parser.parse_args()
+
+    configure(args)
+    results = load_test(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{results['workers']} {results['async_mode']} workers, {results['clients']} clients, "
+              f"queue {results['queue']}")
+        print(f"Delivered {results['delivered']}/{results['sent']} cross-worker messages "
+              f"({results['messages_per_sec']:.0f}/s)")
+        if results['delivered']:
+            print(f"Latency p50 {results['p50_ms']} ms  p95 {results['p95_ms']} ms  "
+                  f"max {results['max_ms']} ms")
+    sys.exit(1 if results['lost'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    In-process LRU cache with a per-entry TTL.
+    Only visible to the worker that filled it.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class KeyValueCache:
+    """
+    Cache stored in a local SQLite file so several worker processes
+    on one host share entries and invalidations.
+    """
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value FROM cache WHERE key = ? AND expires >= ?',
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache WHERE expires < ?', (now,))
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, value, now + self.ttl)
+            )
+
+    def delete_prefix(self, prefix):
+        # Keys are built from ids and ISO dates, so no LIKE wildcards to escape
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache WHERE key LIKE ?', (prefix + '%',))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache')
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+class FeedCache:
+    """
+    Pre-serialized calendar feeds keyed by user and window, with
+    hit/miss counters for monitoring.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(user_id, version, *parts):
+        # The version makes entries from other workers' stale LRUs unreachable
+        return ':'.join(str(p) for p in (user_id, version) + parts)
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def invalidate_user(self, user_id):
+        self.invalidations += 1
+        self.backend.delete_prefix(f'{user_id}:')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+feed_cache = FeedCache()
+
+
+def init_cache(app):
+    ttl = app.config.get('FEED_CACHE_TTL', 300)
+    if app.config.get('FEED_CACHE_TYPE', 'lru') == 'kv':
+        feed_cache.backend = KeyValueCache(app.config['FEED_CACHE_PATH'], ttl=ttl)
+    else:
+        feed_cache.backend = LRUCache(app.config.get('FEED_CACHE_SIZE', 1024), ttl=ttl)
+    return feed_cache
@@ -0,0 +1,135 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import click
+from extensions import db
+from models import User
+from utils import download_canvas_feed, apply_canvas_download, iter_canvas_events
+
+
+class CanvasSyncService:
+    """
+    Periodically refreshes every user with a Canvas URL. Each distinct URL
+    is downloaded once with at most `max_concurrency` downloads in flight;
+    results are applied to the database from the calling thread.
+    """
+
+    def __init__(self, interval=3600, jitter=0.1, max_concurrency=4, fetch_jitter=0):
+        self.app = None
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.fetch_jitter = fetch_jitter
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('CANVAS_SYNC_INTERVAL', self.interval)
+        self.max_concurrency = app.config.get('CANVAS_SYNC_CONCURRENCY', self.max_concurrency)
+        self.fetch_jitter = app.config.get('CANVAS_SYNC_FETCH_JITTER', self.fetch_jitter)
+
+        @app.cli.command('canvas-sync')
+        def canvas_sync_command():
+            """Refresh every user's Canvas calendar once."""
+            click.echo(self.sync_all())
+
+        if app.config.get('CANVAS_SYNC_ENABLED'):
+            self.start()
+
+    def _fetch(self, url, validators):
+        # Spread requests out so a sync doesn't hit Canvas all at once
+        if self.fetch_jitter:
+            time.sleep(random.uniform(0, self.fetch_jitter))
+        etag, last_modified = validators
+        return download_canvas_feed(url, etag, last_modified)
+
+    def sync_all(self):
+        """Run one sync pass. Must be called inside an app context."""
+        users_by_url = defaultdict(list)
+        for user in User.query.filter(User.canvas_ical_url.isnot(None), User.canvas_ical_url != ''):
+            users_by_url[user.canvas_ical_url].append(user)
+
+        summary = {'users': 0, 'urls': len(users_by_url), 'imported': 0, 'unchanged': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='canvas-sync') as pool:
+            futures = {}
+            for url, users in users_by_url.items():
+                # Only revalidate when every user sharing the URL holds the same validators
+                validators = {(u.canvas_etag, u.canvas_last_modified) for u in users}
+                shared = validators.pop() if len(validators) == 1 else (None, None)
+                futures[pool.submit(self._fetch, url, shared)] = url
+
+            for future in as_completed(futures):
+                users = users_by_url[futures[future]]
+                summary['users'] += len(users)
+                try:
+                    download = future.result()
+                except Exception as e:
+                    logging.error(f"Canvas sync download failed: {str(e)}")
+                    download = None
+                self._apply(users, download, summary)
+
+        self.last_run = datetime.utcnow()
+        logging.info(f"Canvas sync finished: {summary}")
+        return summary
+
+    def _apply(self, users, download, summary):
+        events = None
+        if download is not None and download.content is not None and len(users) > 1:
+            # Shared feeds are parsed once up front; a single user streams it
+            try:
+                events = list(iter_canvas_events(download.content))
+            except Exception as e:
+                logging.error(f"Canvas sync parse failed: {str(e)}")
+                download = None
+
+        for user in users:
+            try:
+                if download is None:
+                    raise ValueError('Download failed')
+                result = apply_canvas_download(user, download, events)
+                db.session.commit()
+                summary['unchanged' if result.unchanged else 'imported'] += 1
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Canvas sync failed for user {user.id}: {str(e)}")
+                user.canvas_synced_at = datetime.utcnow()
+                user.canvas_sync_status = 'failed'
+                db.session.commit()
+                summary['failed'] += 1
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='canvas-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            if self._stop.wait(delay):
+                return
+            with self.app.app_context():
+                try:
+                    self.sync_all()
+                except Exception as e:
+                    logging.error(f"Canvas sync pass failed: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+
+canvas_sync = CanvasSyncService()
+
+
+def init_canvas_sync(app):
+    canvas_sync.init_app(app)
+    return canvas_sync
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Fully read response; `headers` is case-insensitive like requests'
+HTTPResponse = namedtuple('HTTPResponse', ['status_code', 'headers', 'content'])
+
+# Statuses worth retrying for idempotent GETs
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+
+class HTTPClient:
+    """
+    Shared client for outbound fetches. One pooled, keep-alive session is
+    reused across requests and threads; every request has connect/read
+    timeouts, bounded retries with exponential backoff and a cap on the
+    body size. Latency and failures are counted for monitoring.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, retries=2, backoff=0.5,
+                 pool_size=10, max_response_size=10 * 1024 * 1024):
+        self._lock = threading.Lock()
+        self.configure(connect_timeout, read_timeout, retries, backoff, pool_size, max_response_size)
+        self.reset_stats()
+
+    def configure(self, connect_timeout, read_timeout, retries, backoff, pool_size, max_response_size):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_response_size = max_response_size
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False  # hand the final error response back to the caller
+        )
+        # pool_maxsize bounds the connections kept open per host
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers['User-Agent'] = 'Timely/1.0'
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        old, self.session = getattr(self, 'session', None), session
+        if old is not None:
+            old.close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.failures = 0
+            self.too_large = 0
+            self.statuses = {}
+            self.bytes = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+
+    def get(self, url, headers=None):
+        """
+        GET `url` and return an HTTPResponse. Raises requests.RequestException
+        on connection errors, timeouts and bodies over max_response_size.
+        """
+        started = time.monotonic()
+        status = None
+        size = 0
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                status = response.status_code
+                length = response.headers.get('Content-Length')
+                if length and length.isdigit() and int(length) > self.max_response_size:
+                    raise ResponseTooLarge(f"Response of {length} bytes from {url} exceeds limit")
+
+                chunks = []
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    # Also catches compressed or chunked bodies without a usable length
+                    if size > self.max_response_size:
+                        raise ResponseTooLarge(f"Response from {url} exceeds {self.max_response_size} bytes")
+                    chunks.append(chunk)
+                return HTTPResponse(status, response.headers, b''.join(chunks))
+        except requests.RequestException as e:
+            with self._lock:
+                self.failures += 1
+                if isinstance(e, ResponseTooLarge):
+                    self.too_large += 1
+            logging.warning(f"GET {url} failed: {str(e)}")
+            raise
+        finally:
+            self._record(status, size, time.monotonic() - started)
+
+    def _record(self, status, size, latency):
+        with self._lock:
+            self.requests += 1
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes += size
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'failures': self.failures,
+                'too_large': self.too_large,
+                'statuses': dict(self.statuses),
+                'bytes': self.bytes,
+                'avg_latency': round(self.total_latency / self.requests, 4) if self.requests else 0.0,
+                'max_latency': round(self.max_latency, 4)
+            }
+
+
+http_client = HTTPClient()
+
+
+def init_http_client(app):
+    http_client.configure(
+        connect_timeout=app.config.get('HTTP_CONNECT_TIMEOUT', 5),
+        read_timeout=app.config.get('HTTP_READ_TIMEOUT', 30),
+        retries=app.config.get('HTTP_RETRIES', 2),
+        backoff=app.config.get('HTTP_BACKOFF', 0.5),
+        pool_size=app.config.get('HTTP_POOL_SIZE', 10),
+        max_response_size=app.config.get('HTTP_MAX_RESPONSE_SIZE', 10 * 1024 * 1024)
+    )
+    return http_client
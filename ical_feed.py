@@ -0,0 +1,75 @@
+from datetime import datetime
+from recurrence import parse_exdates
+from utils import EVENT_DURATION
+
+# RFC 5545 limits content lines to 75 octets before folding
+MAX_LINE_OCTETS = 75
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\')
+                 .replace(';', '\\;')
+                 .replace(',', '\\,')
+                 .replace('\r\n', '\\n')
+                 .replace('\n', '\\n'))
+
+
+def format_datetime(value):
+    # Events are stored as naive wall-clock times, so emit floating times
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def fold(line):
+    """Fold a content line into CRLF-terminated chunks of at most 75 octets."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return line + '\r\n'
+
+    chunks = []
+    limit = MAX_LINE_OCTETS
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = MAX_LINE_OCTETS - 1  # continuation lines start with a space
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+def vevent(event, stamp):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.id}@timely',
+        # RFC 5545 requires DTSTAMP in UTC
+        f'DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}',
+        f'DTSTART:{format_datetime(event.date)}',
+        f'DTEND:{format_datetime(event.date + EVENT_DURATION)}',
+        f'SUMMARY:{escape_text(event.title)}',
+    ]
+    if event.description:
+        lines.append(f'DESCRIPTION:{escape_text(event.description)}')
+    if event.location:
+        lines.append(f'LOCATION:{escape_text(event.location)}')
+    if event.event_type:
+        lines.append(f'CATEGORIES:{escape_text(event.event_type)}')
+    if event.rrule:
+        # Series are exported as-is; subscribers expand them
+        lines.append(f'RRULE:{event.rrule}')
+        for exdate in sorted(parse_exdates(event.exdates)):
+            lines.append(f'EXDATE:{format_datetime(exdate)}')
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def iter_calendar(events, name='Timely', stamp=None):
+    """Yield the calendar one VEVENT at a time from any iterable of Events."""
+    stamp = stamp or datetime.utcnow()
+    yield ('BEGIN:VCALENDAR\r\n'
+           'VERSION:2.0\r\n'
+           'PRODID:-//Timely//Calendar Feed//EN\r\n'
+           'CALSCALE:GREGORIAN\r\n' + fold(f'X-WR-CALNAME:{escape_text(name)}'))
+    for event in events:
+        yield vevent(event, stamp)
+    yield 'END:VCALENDAR\r\n'
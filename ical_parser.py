@@ -0,0 +1,154 @@
+import io
+from datetime import date, datetime, timezone
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+
+def unfold(lines):
+    """Join RFC 5545 folded lines; yields logical lines without line endings."""
+    current = None
+    for line in lines:
+        line = line.rstrip(b'\r\n' if isinstance(line, bytes) else '\r\n')
+        if line[:1] in (b' ', b'\t', ' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def split_line(line):
+    """Split 'NAME;PARAM=x:value' into (NAME, {PARAM: x}, value)."""
+    if '"' not in line:
+        head, sep, value = line.partition(':')
+        if not sep:
+            return None
+        name, *parts = head.split(';')
+        params = {}
+        for param in parts:
+            key, _, param_value = param.partition('=')
+            params[key.upper()] = param_value
+        return name.upper(), params, value
+
+    # Quoted parameter values may contain ':' and ';'
+    quoted = False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return None
+
+    params = {}
+    parts = []
+    start = 0
+    quoted = False
+    for i, char in enumerate(head):
+        if char == '"':
+            quoted = not quoted
+        elif char == ';' and not quoted:
+            parts.append(head[start:i])
+            start = i + 1
+    parts.append(head[start:])
+
+    for param in parts[1:]:
+        key, _, param_value = param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return parts[0].upper(), params, value
+
+
+def unescape_text(value):
+    if '\\' not in value:
+        return value
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '')
+            result.append('\n' if char in 'nN' else char)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def parse_datetime(value, params):
+    """DATE or DATE-TIME value; UTC and TZID times are timezone-aware."""
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+    parsed = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return parsed.replace(tzinfo=timezone.utc)
+    tzid = params.get('TZID')
+    if tzid and ZoneInfo is not None:
+        try:
+            return parsed.replace(tzinfo=ZoneInfo(tzid))
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    # Floating time, or a TZID we cannot resolve: keep the wall-clock time
+    return parsed
+
+
+def iter_vevents(data):
+    """
+    Lazily yield a dict per VEVENT with title, date, description, rrule,
+    exdates and uid. `data` may be bytes, str or any iterable of lines,
+    such as a streamed HTTP response. Only one VEVENT is held at a time;
+    nested components (VALARM) and events without DTSTART are skipped.
+    """
+    if isinstance(data, bytes):
+        data = io.BytesIO(data)
+    elif isinstance(data, str):
+        data = io.StringIO(data)
+
+    event = None
+    depth = 0
+    for line in unfold(data):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        parsed = split_line(line)
+        if parsed is None:
+            continue
+        name, params, value = parsed
+
+        if name == 'BEGIN':
+            if event is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                event = {'title': '', 'date': None, 'description': '',
+                         'rrule': None, 'exdates': [], 'uid': None}
+            continue
+        if event is None:
+            continue
+        if name == 'END':
+            if depth:
+                depth -= 1
+            elif value.upper() == 'VEVENT':
+                if event['date'] is not None:
+                    yield event
+                event = None
+            continue
+        if depth:
+            continue
+
+        if name == 'SUMMARY':
+            event['title'] = unescape_text(value)
+        elif name == 'DESCRIPTION':
+            event['description'] = unescape_text(value)
+        elif name == 'DTSTART':
+            event['date'] = parse_datetime(value, params)
+        elif name == 'RRULE':
+            event['rrule'] = value
+        elif name == 'EXDATE':
+            event['exdates'].extend(parse_datetime(v, params) for v in value.split(',') if v)
+        elif name == 'UID':
+            event['uid'] = value
@@ -1,5 +1,6 @@
 from app import create_app
 from extensions import db
+from flask_migrate import stamp
 from models import User, Class, Event, Message, Notification, CourseResource, StudyGroup, Resource, PeerReview, StudyMeeting
 import os
 
@@ -17,6 +18,9 @@ def init_db():
             
         # Create all tables
         db.create_all()
+
+        # Fresh schema already matches the models, so mark migrations as applied
+        stamp()
         
         print("Database initialized successfully!")
 
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import click
+from extensions import db
+
+
+class Job:
+    """A unit of background work and its progress."""
+
+    def __init__(self, kind, owner_id):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner_id = owner_id
+        self.status = 'queued'
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.future = None
+        # Set when the job lives in a LocalBroker so progress is visible to other processes
+        self.broker = None
+
+    def progress(self, done, total=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if self.broker is not None:
+            self.broker.save(self)
+
+    @property
+    def finished(self):
+        return self.status in ('finished', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class LocalBroker:
+    """
+    Job table in a local SQLite file, standing in for a message broker:
+    any process on the host can enqueue jobs, run them ('flask jobs-worker')
+    and report their status. Tasks must be module-level functions and
+    arguments picklable.
+    """
+
+    COLUMNS = ('id', 'kind', 'owner_id', 'status', 'done', 'total', 'result', 'error',
+               'created_at', 'finished_at')
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, kind TEXT NOT NULL, owner_id INTEGER, '
+                'status TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, '
+                'total INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, '
+                'created_at TEXT NOT NULL, finished_at TEXT, payload BLOB)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def put(self, job, func, args, kwargs):
+        payload = pickle.dumps((func, args, kwargs))
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, owner_id, status, created_at, payload) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job.id, job.kind, job.owner_id, job.status, job.created_at.isoformat(), payload)
+            )
+
+    def claim(self):
+        """Atomically mark the oldest queued job running; returns (job, func, args, kwargs) or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "UPDATE jobs SET status = 'running' WHERE id = ("
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1) "
+                f"RETURNING {', '.join(self.COLUMNS)}, payload"
+            ).fetchone()
+        if row is None:
+            return None
+        func, args, kwargs = pickle.loads(row[-1])
+        return (self._job(row[:-1]), func, args, kwargs)
+
+    def save(self, job):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, done = ?, total = ?, result = ?, error = ?, finished_at = ? '
+                'WHERE id = ?',
+                (job.status, job.done, job.total, json.dumps(job.result), job.error,
+                 job.finished_at.isoformat() if job.finished_at else None, job.id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def _job(self, row):
+        values = dict(zip(self.COLUMNS, row))
+        job = Job(values['kind'], values['owner_id'])
+        job.id = values['id']
+        job.status = values['status']
+        job.done = values['done']
+        job.total = values['total']
+        job.result = json.loads(values['result']) if values['result'] else None
+        job.error = values['error']
+        job.created_at = datetime.fromisoformat(values['created_at'])
+        job.finished_at = datetime.fromisoformat(values['finished_at']) if values['finished_at'] else None
+        job.broker = self
+        return job
+
+
+class JobQueue:
+    """
+    Runs jobs on a small thread pool inside an app context and keeps
+    the most recent ones around for status polling. With a LocalBroker
+    configured, jobs go through the broker instead and are run by worker
+    threads here or in any other process sharing it.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=1000):
+        self.app = None
+        self.broker = None
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.poll_interval = 0.5
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='timely-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._stop = threading.Event()
+        self._workers = []
+
+    def on_finish(self, callback):
+        """Register `callback(job)`, called in the worker after a job finishes or fails."""
+        self._listeners.append(callback)
+        return callback
+
+    def submit(self, kind, owner_id, func, *args, **kwargs):
+        """Queue `func(job, *args, **kwargs)` and return the Job immediately."""
+        job = Job(kind, owner_id)
+        if self.broker is not None:
+            self.broker.put(job, func, args, kwargs)
+            return job
+
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        with self.app.app_context():
+            job.status = 'running'
+            try:
+                job.result = func(job, *args, **kwargs)
+                job.status = 'finished'
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Job {job.id} ({job.kind}) failed: {str(e)}", exc_info=True)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = datetime.utcnow()
+                if job.broker is not None:
+                    job.broker.save(job)
+                db.session.remove()
+
+            for callback in self._listeners:
+                try:
+                    callback(job)
+                except Exception as e:
+                    logging.error(f"Job {job.id} finish callback failed: {str(e)}")
+
+    def work(self, stop=None):
+        """Run broker jobs until `stop` is set."""
+        stop = stop or self._stop
+        while not stop.is_set():
+            try:
+                claimed = self.broker.claim()
+            except Exception as e:
+                logging.error(f"Job broker unavailable: {str(e)}")
+                claimed = None
+            if claimed is None:
+                stop.wait(self.poll_interval)
+                continue
+            self._run(*claimed)
+
+    def start_workers(self, count=None):
+        self._stop.clear()
+        for i in range(count or self.max_workers):
+            worker = threading.Thread(target=self.work, name=f'timely-job-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop_workers(self):
+        self._stop.set()
+
+    def get(self, job_id):
+        if self.broker is not None:
+            return self.broker.get(job_id)
+        return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        job = self.get(job_id)
+        if job and job.future:
+            job.future.exception(timeout=timeout)
+        elif job and self.broker is not None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not job.finished and (deadline is None or time.monotonic() < deadline):
+                time.sleep(self.poll_interval / 5)
+                job = self.get(job_id)
+        return job
+
+
+job_queue = JobQueue()
+
+
+def init_jobs(app):
+    job_queue.app = app
+    # 'thread' runs jobs in this process; 'local' goes through a LocalBroker file
+    if app.config.get('JOB_QUEUE_TYPE', 'thread') == 'local':
+        job_queue.broker = LocalBroker(app.config['JOB_BROKER_PATH'])
+        if app.config.get('JOB_WORKERS', 0):
+            job_queue.start_workers(app.config['JOB_WORKERS'])
+
+    @app.cli.command('jobs-worker')
+    @click.option('--threads', default=1, help='Worker threads in this process.')
+    def jobs_worker_command(threads):
+        """Run jobs queued in the local broker until interrupted."""
+        if job_queue.broker is None:
+            raise click.ClickException('JOB_QUEUE_TYPE must be "local" to run a worker')
+        job_queue.start_workers(threads)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            job_queue.stop_workers()
+
+    return job_queue
@@ -0,0 +1,28 @@
+"""add event window indexes
+
+Revision ID: 3f1c2a9d7b10
+Revises: 
+Create Date: 2026-10-18 09:12:44.318201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by init_db.py before migrations existed already have
+    # the tables, so only the indexes are added here.
+    op.create_index('ix_event_user_id_date', 'event', ['user_id', 'date'], unique=False, if_not_exists=True)
+    op.create_index('ix_event_class_id', 'event', ['class_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_event_class_id', table_name='event')
+    op.drop_index('ix_event_user_id_date', table_name='event')
@@ -0,0 +1,30 @@
+"""add user canvas feed validators
+
+Revision ID: 5b0d8f3e6a97
+Revises: e917d3b84c25
+Create Date: 2026-10-18 14:52:10.663284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0d8f3e6a97'
+down_revision = 'e917d3b84c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('canvas_etag', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('canvas_last_modified', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('canvas_content_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('canvas_content_hash')
+        batch_op.drop_column('canvas_last_modified')
+        batch_op.drop_column('canvas_etag')
@@ -0,0 +1,41 @@
+"""recompute event recurrence end
+
+Revision ID: 5d2e8b7a1c93
+Revises: c47a1e9d3b60
+Create Date: 2026-10-18 22:05:13.408211
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+from recurrence import series_end, naive_until
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8b7a1c93'
+down_revision = 'c47a1e9d3b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # recurrence_end used to stop at the 500th occurrence, and Canvas rules
+    # kept a UTC UNTIL next to their naive start
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('date', sa.DateTime),
+                     sa.column('rrule', sa.String), sa.column('recurrence_end', sa.DateTime))
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(event.c.id, event.c.date, event.c.rrule)
+                        .where(event.c.rrule.isnot(None))).all()
+    for event_id, date, rule in rows:
+        rule = naive_until(rule, date)
+        try:
+            end = series_end(rule, date)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Leaving event {event_id} with invalid recurrence {rule!r}: {str(e)}")
+            continue
+        conn.execute(event.update().where(event.c.id == event_id)
+                     .values(rrule=rule, recurrence_end=end))
+
+
+def downgrade():
+    pass
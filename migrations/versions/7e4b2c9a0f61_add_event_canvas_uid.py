@@ -0,0 +1,30 @@
+"""add event canvas uid
+
+Revision ID: 7e4b2c9a0f61
+Revises: d6f2a81c4b3e
+Create Date: 2026-10-18 18:21:03.540127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e4b2c9a0f61'
+down_revision = 'd6f2a81c4b3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('canvas_uid', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('canvas_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_event_user_id_canvas_uid', ['user_id', 'canvas_uid'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_user_id_canvas_uid')
+        batch_op.drop_column('canvas_hash')
+        batch_op.drop_column('canvas_uid')
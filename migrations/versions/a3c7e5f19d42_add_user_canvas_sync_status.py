@@ -0,0 +1,28 @@
+"""add user canvas sync status
+
+Revision ID: a3c7e5f19d42
+Revises: 5b0d8f3e6a97
+Create Date: 2026-10-18 15:37:48.290514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e5f19d42'
+down_revision = '5b0d8f3e6a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('canvas_synced_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('canvas_sync_status', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('canvas_sync_status')
+        batch_op.drop_column('canvas_synced_at')
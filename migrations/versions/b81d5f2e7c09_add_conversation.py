@@ -0,0 +1,72 @@
+"""add conversation
+
+Revision ID: b81d5f2e7c09
+Revises: 7e4b2c9a0f61
+Create Date: 2026-10-18 19:44:12.906318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d5f2e7c09'
+down_revision = '7e4b2c9a0f61'
+branch_labels = None
+depends_on = None
+
+PREVIEW_LENGTH = 200
+
+
+def upgrade():
+    conversation = op.create_table('conversation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_low_id', sa.Integer(), nullable=False),
+        sa.Column('user_high_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('last_sender_id', sa.Integer(), nullable=True),
+        sa.Column('last_preview', sa.String(length=200), nullable=True),
+        sa.Column('unread_low', sa.Integer(), nullable=False),
+        sa.Column('unread_high', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['last_message_id'], ['message.id'], ),
+        sa.ForeignKeyConstraint(['user_high_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['user_low_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair')
+    )
+    op.create_index('ix_conversation_user_high_id', 'conversation', ['user_high_id'], unique=False)
+
+    # Backfill from existing chat messages, oldest first so the last one wins
+    message = sa.table('message',
+        sa.column('id', sa.Integer), sa.column('sender_id', sa.Integer),
+        sa.column('recipient_id', sa.Integer), sa.column('content', sa.Text),
+        sa.column('timestamp', sa.DateTime), sa.column('status', sa.String),
+        sa.column('message_type', sa.String))
+    rows = {}
+    messages = op.get_bind().execute(
+        sa.select(message.c.id, message.c.sender_id, message.c.recipient_id, message.c.content,
+                  message.c.timestamp, message.c.status)
+        .where(sa.or_(message.c.message_type == 'message', message.c.message_type.is_(None)))
+        .order_by(message.c.timestamp, message.c.id)
+    )
+    for message_id, sender_id, recipient_id, content, timestamp, status in messages:
+        low, high = sorted((sender_id, recipient_id))
+        row = rows.setdefault((low, high), {
+            'user_low_id': low, 'user_high_id': high, 'unread_low': 0, 'unread_high': 0
+        })
+        row.update(last_message_id=message_id, last_message_at=timestamp,
+                   last_sender_id=sender_id, last_preview=(content or '')[:PREVIEW_LENGTH])
+        if status == 'unread':
+            row['unread_low' if recipient_id == low else 'unread_high'] += 1
+
+    if rows:
+        op.bulk_insert(conversation, [
+            dict({'last_message_id': None, 'last_message_at': None, 'last_sender_id': None,
+                  'last_preview': None}, **row) for row in rows.values()
+        ])
+
+
+def downgrade():
+    op.drop_index('ix_conversation_user_high_id', table_name='conversation')
+    op.drop_table('conversation')
@@ -0,0 +1,34 @@
+"""add user unread messages
+
+Revision ID: c47a1e9d3b60
+Revises: f3a9c6d1e528
+Create Date: 2026-10-18 21:12:40.502917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a1e9d3b60'
+down_revision = 'f3a9c6d1e528'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_messages', sa.Integer(), nullable=False, server_default='0'))
+
+    # Every unread message counts, connection requests included, matching
+    # the COUNT the badge used before
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('unread_messages', sa.Integer))
+    message = sa.table('message', sa.column('recipient_id', sa.Integer), sa.column('status', sa.String))
+    unread = sa.select(sa.func.count()).where(
+        message.c.recipient_id == user.c.id, message.c.status == 'unread').scalar_subquery()
+    op.execute(user.update().values(unread_messages=unread))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_messages')
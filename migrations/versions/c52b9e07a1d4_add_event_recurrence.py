@@ -0,0 +1,30 @@
+"""add event recurrence
+
+Revision ID: c52b9e07a1d4
+Revises: 8a4e61c0d2f3
+Create Date: 2026-10-18 11:21:05.904377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52b9e07a1d4'
+down_revision = '8a4e61c0d2f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rrule', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('exdates', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('recurrence_end', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('recurrence_end')
+        batch_op.drop_column('exdates')
+        batch_op.drop_column('rrule')
@@ -0,0 +1,24 @@
+"""add class name index
+
+Revision ID: d6f2a81c4b3e
+Revises: a3c7e5f19d42
+Create Date: 2026-10-18 17:05:37.214906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6f2a81c4b3e'
+down_revision = 'a3c7e5f19d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_class_name', 'class', ['name'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_class_name', table_name='class')
@@ -0,0 +1,30 @@
+"""add user calendar feed
+
+Revision ID: e917d3b84c25
+Revises: c52b9e07a1d4
+Create Date: 2026-10-18 13:40:52.117630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e917d3b84c25'
+down_revision = 'c52b9e07a1d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('calendar_updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('calendar_token', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_user_calendar_token', ['calendar_token'])
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_calendar_token', type_='unique')
+        batch_op.drop_column('calendar_token')
+        batch_op.drop_column('calendar_updated_at')
@@ -0,0 +1,44 @@
+"""add message conversation key
+
+Revision ID: f3a9c6d1e528
+Revises: b81d5f2e7c09
+Create Date: 2026-10-18 20:31:57.118043
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c6d1e528'
+down_revision = 'b81d5f2e7c09'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('conversation_key', sa.String(length=40), nullable=True))
+
+    message = sa.table('message', sa.column('sender_id', sa.Integer),
+                       sa.column('recipient_id', sa.Integer),
+                       sa.column('conversation_key', sa.String))
+    low = sa.case((message.c.sender_id < message.c.recipient_id, message.c.sender_id),
+                  else_=message.c.recipient_id)
+    high = sa.case((message.c.sender_id < message.c.recipient_id, message.c.recipient_id),
+                   else_=message.c.sender_id)
+    op.execute(message.update().values(
+        conversation_key=sa.cast(low, sa.String) + ':' + sa.cast(high, sa.String)
+    ))
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.alter_column('conversation_key', existing_type=sa.String(length=40), nullable=False)
+        batch_op.create_index('ix_message_conversation_key_timestamp', ['conversation_key', 'timestamp'], unique=False)
+        batch_op.create_index('ix_message_recipient_id_status', ['recipient_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_recipient_id_status')
+        batch_op.drop_index('ix_message_conversation_key_timestamp')
+        batch_op.drop_column('conversation_key')
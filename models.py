@@ -19,10 +19,23 @@ class User(db.Model):
     email = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(150), nullable=False)
     canvas_ical_url = db.Column(db.String(500))
+    # Validators from the last Canvas fetch, used for conditional refetches
+    canvas_etag = db.Column(db.String(200))
+    canvas_last_modified = db.Column(db.String(100))
+    canvas_content_hash = db.Column(db.String(64))
+    canvas_synced_at = db.Column(db.DateTime)
+    canvas_sync_status = db.Column(db.String(20))  # ok, unchanged, failed
     email_notifications = db.Column(db.Boolean, default=True, nullable=False)
     study_reminders = db.Column(db.Boolean, default=True, nullable=False)
     group_notifications = db.Column(db.Boolean, default=True, nullable=False)
     theme = db.Column(db.String(20), default='light', nullable=False)
+    # Bumped whenever anything shown on the user's calendar changes
+    calendar_version = db.Column(db.Integer, default=0, nullable=False)
+    calendar_updated_at = db.Column(db.DateTime)
+    # Secret for the subscribable .ics feed
+    calendar_token = db.Column(db.String(64), unique=True)
+    # Unread chat messages across all conversations, kept in step with Conversation
+    unread_messages = db.Column(db.Integer, default=0, nullable=False)
     
     # Relationships
     classes = db.relationship(
@@ -54,6 +67,13 @@ class User(db.Model):
         ).count()
         return min(count, 99)
 
+    def set_canvas_url(self, url):
+        if url != self.canvas_ical_url:
+            self.canvas_ical_url = url
+            self.canvas_etag = None
+            self.canvas_last_modified = None
+            self.canvas_content_hash = None
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -79,6 +99,10 @@ class Class(db.Model):
     # Update events relationship to use back_populates instead of backref
     events = db.relationship('Event', back_populates='class_', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_class_name', 'name'),
+    )
+
     def __repr__(self):
         return f'<Class {self.name}>'
 
@@ -90,6 +114,13 @@ class Event(db.Model):
     location = db.Column(db.String(100))
     event_type = db.Column(db.String(50), default='assignment')
     status = db.Column(db.String(20), default='pending')
+    # Recurring series: `date` is the first occurrence, expanded per window
+    rrule = db.Column(db.String(500))
+    exdates = db.Column(db.Text)  # comma-separated ISO datetimes
+    recurrence_end = db.Column(db.DateTime)  # last occurrence, NULL if unbounded
+    # Set on events imported from Canvas; used to diff against the feed
+    canvas_uid = db.Column(db.String(255))
+    canvas_hash = db.Column(db.String(64))
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'))
@@ -97,13 +128,26 @@ class Event(db.Model):
     user = db.relationship('User', back_populates='events')
     class_ = db.relationship('Class', back_populates='events')
 
+    # Calendar feeds always filter by owner and date range
+    __table_args__ = (
+        db.Index('ix_event_user_id_date', 'user_id', 'date'),
+        db.Index('ix_event_class_id', 'class_id'),
+        db.Index('ix_event_user_id_canvas_uid', 'user_id', 'canvas_uid', unique=True),
+    )
+
     def __repr__(self):
         return f'<Event {self.title}>'
 
+def conversation_key_default(context):
+    params = context.get_current_parameters()
+    return Message.key_for(params['sender_id'], params['recipient_id'])
+
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Same for both directions of a chat: 'low_id:high_id'
+    conversation_key = db.Column(db.String(40), nullable=False, default=conversation_key_default)
     content = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.now(timezone.utc))
     message_type = db.Column(db.String(50), default='message')
@@ -112,9 +156,51 @@ class Message(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id], back_populates='sent_messages')
     recipient = db.relationship('User', foreign_keys=[recipient_id], back_populates='received_messages')
 
+    # Chat history by conversation and time; unread lookups by recipient
+    __table_args__ = (
+        db.Index('ix_message_conversation_key_timestamp', 'conversation_key', 'timestamp'),
+        db.Index('ix_message_recipient_id_status', 'recipient_id', 'status'),
+    )
+
+    @staticmethod
+    def key_for(user_id, other_id):
+        return f'{min(user_id, other_id)}:{max(user_id, other_id)}'
+
     def __repr__(self):
         return f'<Message {self.id}>'
 
+class Conversation(db.Model):
+    """
+    One row per pair of users, kept current as messages are sent and read
+    so the inbox can be listed without touching the message table. The
+    pair is stored ordered: user_low_id < user_high_id.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_low_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('message.id'))
+    last_message_at = db.Column(db.DateTime)
+    last_sender_id = db.Column(db.Integer)
+    last_preview = db.Column(db.String(200))
+    # Messages each side has not read yet
+    unread_low = db.Column(db.Integer, nullable=False, default=0)
+    unread_high = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair'),
+        db.Index('ix_conversation_user_high_id', 'user_high_id'),
+    )
+
+    @staticmethod
+    def pair(user_id, other_id):
+        return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+    def unread_for(self, user_id):
+        return self.unread_low if user_id == self.user_low_id else self.unread_high
+
+    def __repr__(self):
+        return f'<Conversation {self.user_low_id}-{self.user_high_id}>'
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -0,0 +1,138 @@
+import logging
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from dateutil.rrule import rrulestr
+
+# Cap on occurrences produced for a single series and window
+MAX_OCCURRENCES = 500
+# Cap on COUNT, so a series' end can be found by walking it
+MAX_SERIES_COUNT = 1000
+# Series repeat at most daily; expanding a window walks every occurrence since DTSTART
+ALLOWED_FREQS = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+FREQ_RE = re.compile(r'(?:^|;)FREQ=([A-Z]*)', re.IGNORECASE)
+COUNT_RE = re.compile(r'(?:^|;)COUNT=(\d+)', re.IGNORECASE)
+# More than one BYHOUR/BYMINUTE/BYSECOND value repeats a series within the day
+SUB_DAILY_RE = re.compile(r'(?:^|;)BY(?:HOUR|MINUTE|SECOND)=[^;]*,', re.IGNORECASE)
+
+UNTIL_RE = re.compile(r'(UNTIL=)(\d{8})(T\d{6})?(Z?)', re.IGNORECASE)
+
+
+def parse_exdates(exdates):
+    """Parse stored EXDATEs (comma-separated ISO datetimes) into a frozenset."""
+    if not exdates:
+        return frozenset()
+    return frozenset(datetime.fromisoformat(d) for d in exdates.split(',') if d)
+
+
+def format_exdates(dates):
+    return ','.join(sorted(d.isoformat() for d in dates)) or None
+
+
+def parse_until(match):
+    return datetime.strptime(match.group(2) + (match.group(3) or 'T000000').upper(), '%Y%m%dT%H%M%S')
+
+
+def naive_until(rule, dtstart):
+    """
+    Rewrite a UTC 'UNTIL=...Z' as wall-clock time in dtstart's zone, to
+    store alongside a DTSTART whose tzinfo is being dropped.
+    """
+    match = UNTIL_RE.search(rule)
+    if not match or not match.group(4):
+        return rule
+    until = parse_until(match).replace(tzinfo=timezone.utc)
+    if getattr(dtstart, 'tzinfo', None) is not None:
+        until = until.astimezone(dtstart.tzinfo)
+    return rule[:match.start()] + f'UNTIL={until:%Y%m%dT%H%M%S}' + rule[match.end():]
+
+
+def match_until(rule, dtstart):
+    # dateutil wants UNTIL in UTC for an aware DTSTART and naive for a naive one
+    match = UNTIL_RE.search(rule)
+    if not match or bool(match.group(4)) == (dtstart.tzinfo is not None):
+        return rule
+    if dtstart.tzinfo is None:
+        return naive_until(rule, dtstart)
+    until = parse_until(match).replace(tzinfo=dtstart.tzinfo).astimezone(timezone.utc)
+    return rule[:match.start()] + f'UNTIL={until:%Y%m%dT%H%M%SZ}' + rule[match.end():]
+
+
+def build_rule(rule, dtstart):
+    """
+    Build a dateutil rule from an RRULE value such as 'FREQ=WEEKLY;BYDAY=MO,WE'.
+    Raises ValueError if the rule is malformed.
+    """
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[6:]
+    if 'DTSTART' in rule.upper():
+        raise ValueError('RRULE must not contain DTSTART')
+    freq = FREQ_RE.search(rule)
+    if freq and freq.group(1).upper() not in ALLOWED_FREQS:
+        raise ValueError('RRULE must repeat at most daily')
+    if SUB_DAILY_RE.search(rule):
+        raise ValueError('RRULE must repeat at most daily')
+    count = COUNT_RE.search(rule)
+    if count and int(count.group(1)) > MAX_SERIES_COUNT:
+        raise ValueError(f'RRULE COUNT is limited to {MAX_SERIES_COUNT}')
+    return rrulestr(match_until(rule, dtstart), dtstart=dtstart)
+
+
+def series_end(rule, dtstart):
+    """
+    Latest start the series can reach (its UNTIL, or the last of COUNT
+    occurrences), or None for unbounded series. Not capped like expand().
+    """
+    upper = rule.upper()
+    if 'UNTIL=' not in upper and 'COUNT=' not in upper:
+        return None
+    parsed = build_rule(rule, dtstart)
+    match = UNTIL_RE.search(match_until(rule, dtstart))
+    if match:
+        until = parse_until(match)
+        return until.replace(tzinfo=timezone.utc) if match.group(4) else until
+    # COUNT is capped by build_rule, so this walk is bounded
+    last = None
+    for last in parsed:
+        pass
+    return last
+
+
+@lru_cache(maxsize=4096)
+def expand(rule, dtstart, exdates, window_start=None, window_end=None):
+    """
+    Occurrence start times of a series that begin inside [window_start, window_end).
+    Arguments are plain hashable values so repeated windows are served from cache.
+    """
+    excluded = parse_exdates(exdates)
+    rule = build_rule(rule, dtstart)
+    if window_start is not None:
+        occurrences = rule.xafter(window_start, inc=True)
+    else:
+        occurrences = iter(rule)
+
+    result = []
+    for occurrence in occurrences:
+        if window_end is not None and occurrence >= window_end:
+            break
+        if occurrence not in excluded:
+            result.append(occurrence)
+            if len(result) >= MAX_OCCURRENCES:
+                break
+    return tuple(result)
+
+
+def event_occurrences(event, window_start=None, window_end=None):
+    """
+    Start times of an Event inside the window, expanding its RRULE if any.
+    A series whose stored rule cannot be expanded is logged and skipped.
+    """
+    if not event.rrule:
+        return (event.date,)
+    try:
+        return expand(event.rrule, event.date, event.exdates, window_start, window_end)
+    except (TypeError, ValueError) as e:
+        logging.error(f"Skipping event {event.id} with invalid recurrence {event.rrule!r}: {str(e)}")
+        return ()
@@ -1,17 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash, current_app, send_from_directory, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash, current_app, send_from_directory, send_file, stream_with_context
 from extensions import db
-from models import User, Class, Event, Message, Notification, CourseResource, StudyGroup, Resource, StudyMeeting
+from cache import feed_cache
+from http_client import http_client
+from recurrence import event_occurrences, build_rule, series_end, format_exdates
+from scheduler import load_busy_indexes, load_busy_intervals, load_study_hours, plan_study_sessions, plan_class_study_sessions, DAILY_CAPACITY
+from jobs import job_queue
+from socket_queue import LocalPubSubManager
+from ical_feed import iter_calendar
+from availability import common_free_bitmap, free_ranges, SLOT
+from models import User, Class, Event, Message, Notification, CourseResource, StudyGroup, Resource, StudyMeeting, user_classes, study_group_members, Conversation, friends as friends_table
 from datetime import datetime, timedelta, timezone
 from utils import (
     login_required,
     fetch_canvas_events,
-    fetch_canvas_courses,
+    run_canvas_import,
     parse_ical_data,
     extract_course_name,
     process_canvas_events,
+    parse_date_window,
+    bump_calendar_version,
+    bump_class_calendar_versions,
+    calendar_etag,
+    event_window_filter,
+    EVENT_DURATION,
     allowed_file,
-    create_notification
+    create_notification,
+    record_message,
+    mark_conversation_read,
+    add_unread_messages,
+    unread_message_count
 )
+import base64
+import binascii
 import logging
 import os
 import re
@@ -23,6 +43,8 @@ import requests
 import icalendar
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import current_user
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.orm import contains_eager
 
 # Initialize Blueprints
 main_routes = Blueprint('main', __name__)
@@ -36,11 +58,39 @@ class_routes = Blueprint('classes', __name__)
 
 socketio = SocketIO()
 
+# Largest list add_event accepts in one request
+MAX_EVENT_BATCH = 500
+# Messages per chat history page
+CHAT_PAGE_SIZE = 50
+
+# Longest window common_free_time will build bitmaps for
+MAX_FREE_TIME_RANGE = timedelta(days=31)
+
 # Add this after your blueprint definitions
 def init_socketio(app):
-    socketio.init_app(app, cors_allowed_origins="*")
+    # With several server processes, room emits must go through a shared
+    # queue or they only reach clients connected to the emitting process
+    queue = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    options = {'cors_allowed_origins': "*"}
+    if app.config.get('SOCKETIO_ASYNC_MODE'):
+        options['async_mode'] = app.config['SOCKETIO_ASYNC_MODE']
+    if queue == 'local':
+        options['client_manager'] = LocalPubSubManager(app.config['SOCKETIO_QUEUE_PATH'])
+    elif queue:
+        options['message_queue'] = queue  # redis://, kafka://, zmq+ or a kombu URL
+    socketio.init_app(app, **options)
     return socketio
 
+@job_queue.on_finish
+def notify_job_finished(job):
+    # Runs in the job worker, outside any request
+    socketio.emit('job_finished', job.to_dict(), room=f"user_{job.owner_id}")
+
+def push_unread_count(user_id):
+    # Badges listen on the user's room; polling is only a fallback
+    socketio.emit('unread_count', {'count': min(unread_message_count(user_id), 99)},
+                  room=f"user_{user_id}")
+
 @socketio.on('connect')
 def handle_connect():
     if 'user_id' in session:
@@ -65,21 +115,17 @@ def handle_message(data):
             timestamp=datetime.utcnow()
         )
         db.session.add(message)
+        record_message(message)
         db.session.commit()
         
-        message_data = {
-            'id': message.id,
-            'content': message.content,
-            'sender_id': message.sender_id,
-            'timestamp': message.timestamp.strftime('%I:%M %p')
-        }
+        message_data = serialize_message(message)
         
         # Emit to both sender and recipient rooms
         emit('new_message', message_data, room=f"user_{sender_id}")
         emit('new_message', message_data, room=f"user_{recipient_id}")
         
         # Update unread count for recipient
-        emit('update_unread', room=f"user_{recipient_id}")
+        push_unread_count(recipient_id)
         
     except Exception as e:
         logging.error(f"Socket error: {str(e)}")
@@ -128,8 +174,8 @@ def signup():
             db.session.add(new_user)
             db.session.commit()
             if canvas_ical_url:
-                fetch_canvas_courses(canvas_ical_url, new_user)
-                fetch_canvas_events(canvas_ical_url, new_user)
+                job_queue.submit('canvas_import', new_user.id, run_canvas_import,
+                                 new_user.id, canvas_ical_url)
             flash('Account created successfully!', 'success')
             return redirect(url_for('auth.login'))
         except Exception as e:
@@ -174,20 +220,12 @@ def logout():
 def calendar():
     try:
         user = db.session.get(User, session['user_id'])
-        # Filter out archived classes
-        active_classes = [c for c in user.classes if not c.archived]
-        
-        # Only get events from active classes
-        events = Event.query.join(Class).filter(
-            Event.user_id == user.id,
-            Class.archived == False
-        ).all()
-        
-        # Get classmates for each active class
-        classmates_by_class = {}
-        for class_obj in active_classes:
-            classmates = [student for student in class_obj.students if student.id != user.id]
-            classmates_by_class[class_obj.id] = classmates
+        # Events and classmates are fetched by the page once it has rendered
+        active_classes = (Class.query
+                          .join(user_classes, user_classes.c.class_id == Class.id)
+                          .filter(user_classes.c.user_id == user.id, Class.archived == False)
+                          .order_by(Class.name)
+                          .all())
         
         # Safely check for Canvas URL
         show_canvas_import = bool(getattr(user, 'canvas_ical_url', None))
@@ -195,9 +233,7 @@ def calendar():
         return render_template('calendar.html',
             user=user,
             classes=active_classes,
-            events=events,
-            show_canvas_import=show_canvas_import,
-            classmates_by_class=classmates_by_class
+            show_canvas_import=show_canvas_import
         )
         
     except Exception as e:
@@ -205,39 +241,192 @@ def calendar():
         flash('An error occurred while loading your calendar.', 'error')
         return redirect(url_for('main.home'))
 
+@calendar_routes.route('/classmates/<int:class_id>')
+@login_required
+def get_classmates(class_id):
+    try:
+        user_id = session['user_id']
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+
+        enrolled = db.session.query(user_classes).filter_by(
+            user_id=user_id, class_id=class_id).first()
+        if not enrolled:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        # Fetch one extra row to know whether another page exists
+        rows = (db.session.query(User.id, User.username)
+                .join(user_classes, user_classes.c.user_id == User.id)
+                .filter(user_classes.c.class_id == class_id, User.id != user_id)
+                .order_by(User.username)
+                .offset((page - 1) * per_page)
+                .limit(per_page + 1)
+                .all())
+
+        return jsonify({
+            'classmates': [{'id': id, 'username': username} for id, username in rows[:per_page]],
+            'page': page,
+            'has_next': len(rows) > per_page
+        })
+
+    except Exception as e:
+        logging.error(f"Error getting classmates: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @calendar_routes.route('/events')
 @login_required
 def get_calendar_events():
     try:
-        user = db.session.get(User, session['user_id'])
-        # Only get events from non-archived classes
-        events = Event.query.join(Class).filter(
-            Event.user_id == user.id,
-            Class.archived == False
-        ).all()
+        window_start, window_end = parse_date_window(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+
+    # Answer revalidations from the user's calendar version alone
+    user = db.session.get(User, session['user_id'])
+    etag = calendar_etag(user, request.args.get('start', ''), request.args.get('end', ''))
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    try:
+        cache_key = feed_cache.key(user.id, user.calendar_version,
+                                   request.args.get('start', ''), request.args.get('end', ''))
+        body = feed_cache.get(cache_key)
+        if body is None:
+            body = current_app.json.dumps(serialize_feed_events(user.id, window_start, window_end))
+            feed_cache.set(cache_key, body)
+
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
         
-        event_list = []
-        for event in events:
-            event_color = event.class_.color if event.class_ else '#808080'
-            if event.event_type == 'study_session':
-                event_color = '#4CAF50'  # Green for study sessions
-                
-            event_list.append({
+    except Exception as e:
+        # Bad series are skipped in event_occurrences; anything else is a real failure,
+        # and an empty 200 would look like a blank calendar
+        logging.error(f"Error fetching calendar events: {str(e)}")
+        return jsonify({'error': 'Error fetching calendar events'}), 500
+
+def serialize_feed_events(user_id, window_start=None, window_end=None):
+    # Only get events from non-archived classes (or with no class)
+    query = (Event.query
+             .outerjoin(Class, Event.class_id == Class.id)
+             .options(contains_eager(Event.class_))
+             .filter(
+                 Event.user_id == user_id,
+                 or_(Event.class_id.is_(None), Class.archived == False)
+             ))
+
+    # Push the visible range into SQL so (user_id, date) index does the work
+    if window_start is not None:
+        query = query.filter(event_window_filter(window_start, window_end))
+        expand_from = window_start - EVENT_DURATION
+    else:
+        expand_from = None
+
+    event_list = []
+    for event in query.all():
+        event_color = event.class_.color if event.class_ else '#808080'
+        if event.event_type == 'study_session':
+            event_color = '#4CAF50'  # Green for study sessions
+
+        # Recurring series are stored once and expanded only for this window
+        for start in event_occurrences(event, expand_from, window_end):
+            item = {
                 'id': event.id,
                 'title': event.title,
-                'start': event.date.isoformat(),
-                'end': (event.date + timedelta(hours=1)).isoformat(),
+                'start': start.isoformat(),
+                'end': (start + EVENT_DURATION).isoformat(),
                 'description': event.description,
                 'type': event.event_type,
                 'backgroundColor': event_color,
                 'className': event.event_type
-            })
-        
-        return jsonify(event_list)
-        
+            }
+            if event.rrule:
+                item['groupId'] = event.id
+            event_list.append(item)
+
+    event_list.sort(key=lambda item: item['start'])
+    return event_list
+
+@calendar_routes.route('/feed_token', methods=['POST'])
+@login_required
+def create_feed_token():
+    try:
+        user = db.session.get(User, session['user_id'])
+        # Rotating the token revokes every existing subscription
+        user.calendar_token = secrets.token_urlsafe(32)
+        db.session.commit()
+        return jsonify({
+            'success': True,
+            'url': url_for('calendar.ical_feed', token=user.calendar_token, _external=True)
+        })
     except Exception as e:
-        logging.error(f"Error fetching calendar events: {str(e)}")
-        return jsonify([])
+        db.session.rollback()
+        logging.error(f"Error creating feed token: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error creating feed link'}), 500
+
+@calendar_routes.route('/feed/<token>.ics')
+def ical_feed(token):
+    user = User.query.filter_by(calendar_token=token).first()
+    if not user:
+        return jsonify({'error': 'Feed not found'}), 404
+
+    etag = calendar_etag(user, 'ics')
+    last_modified = user.calendar_updated_at.replace(microsecond=0) if user.calendar_updated_at else None
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = bool(last_modified and since and last_modified <= since.replace(tzinfo=None))
+    if not_modified:
+        return ical_feed_response(None, etag, last_modified, status=304)
+
+    cache_key = feed_cache.key(user.id, user.calendar_version, 'ics')
+    body = feed_cache.get(cache_key)
+    if body is not None:
+        return ical_feed_response(body, etag, last_modified)
+
+    events = (Event.query
+              .outerjoin(Class, Event.class_id == Class.id)
+              .filter(Event.user_id == user.id,
+                      or_(Event.class_id.is_(None), Class.archived == False))
+              .order_by(Event.date)
+              .yield_per(500))
+    calendar_name = f"Timely - {user.username}"
+
+    def generate():
+        # Stream VEVENTs as they are read and keep the body for the next poll
+        chunks = []
+        for chunk in iter_calendar(events, name=calendar_name):
+            chunks.append(chunk)
+            yield chunk
+        feed_cache.set(cache_key, ''.join(chunks))
+
+    return ical_feed_response(stream_with_context(generate()), etag, last_modified)
+
+def ical_feed_response(body, etag, last_modified, status=200):
+    response = current_app.response_class(body, status=status, mimetype='text/calendar')
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    return response
+
+@calendar_routes.route('/cache_stats')
+@login_required
+def get_cache_stats():
+    return jsonify(feed_cache.stats())
+
+@calendar_routes.route('/http_stats')
+@login_required
+def get_http_stats():
+    return jsonify(http_client.stats())
 
 @calendar_routes.route('/add_class', methods=['GET', 'POST'])
 @login_required
@@ -254,7 +443,8 @@ def add_class():
             user = db.session.get(User, session['user_id'])
             new_class = Class(
                 name=class_name,
-                color=class_color
+                color=class_color,
+                created_by=user.id
             )
             db.session.add(new_class)
             user.classes.append(new_class)
@@ -275,26 +465,174 @@ def add_class():
 @login_required
 def add_event():
     data = request.get_json()
+    if isinstance(data, list):
+        return add_events_batch(data)
     if not data or 'title' not in data or 'date' not in data:
         return jsonify({'success': False, 'message': 'Missing required fields'}), 400
     
     try:
+        date = datetime.fromisoformat(data['date'])
         event = Event(
             title=data['title'],
             description=data.get('description', ''),
-            date=datetime.fromisoformat(data['date']),
+            date=date,
             location=data.get('location', ''),
             event_type=data.get('event_type', 'assignment'),
             user_id=session['user_id'],
-            class_id=data.get('class_id')
+            class_id=data.get('class_id'),
+            **recurrence_fields(data, date)
         )
         db.session.add(event)
+        bump_calendar_version(session['user_id'])
         db.session.commit()
         return jsonify({'success': True, 'message': 'Event added successfully'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 400
 
+def recurrence_fields(data, date):
+    """Validate optional `rrule`/`exdates` payload fields into Event columns."""
+    rule = data.get('rrule')
+    if not rule:
+        return {}
+    if not isinstance(rule, str):
+        raise ValueError('Invalid recurrence rule')
+    try:
+        build_rule(rule, date)
+        exdates = [datetime.fromisoformat(d) for d in data.get('exdates') or []]
+    except (TypeError, ValueError):
+        raise ValueError('Invalid recurrence rule')
+    return {
+        'rrule': rule,
+        'exdates': format_exdates(exdates),
+        'recurrence_end': series_end(rule, date)
+    }
+
+def text_field(data, field, default='', max_length=None):
+    """An optional string field of an add_event payload."""
+    value = data.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid {field}')
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f'{field.capitalize()} is too long')
+    return value
+
+def event_row_from_payload(data, user_id, class_ids):
+    """
+    Validate one add_event payload and build its insert row.
+    Raises ValueError with a user-facing message.
+    """
+    if not isinstance(data, dict) or not data.get('title') or not data.get('date'):
+        raise ValueError('Missing required fields')
+    if not isinstance(data['title'], str):
+        raise ValueError('Invalid title')
+    if len(data['title']) > 100:
+        raise ValueError('Title is too long')
+
+    try:
+        date = datetime.fromisoformat(data['date'])
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date')
+
+    class_id = data.get('class_id')
+    if class_id in (None, ''):
+        class_id = None
+    elif isinstance(class_id, bool):
+        raise ValueError('Invalid class')
+    else:
+        try:
+            class_id = int(class_id)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid class')
+        if class_id not in class_ids:
+            raise ValueError('Invalid class')
+
+    return {
+        'title': data['title'],
+        'description': text_field(data, 'description'),
+        'date': date,
+        'location': text_field(data, 'location', max_length=100),
+        'event_type': text_field(data, 'event_type', 'assignment', max_length=50),
+        'user_id': user_id,
+        'class_id': class_id,
+        'rrule': None,
+        'exdates': None,
+        'recurrence_end': None,
+        **recurrence_fields(data, date)
+    }
+
+def add_events_batch(items):
+    if not items:
+        return jsonify({'success': False, 'message': 'No events provided'}), 400
+    if len(items) > MAX_EVENT_BATCH:
+        return jsonify({
+            'success': False,
+            'message': f'At most {MAX_EVENT_BATCH} events per request'
+        }), 400
+
+    user = db.session.get(User, session['user_id'])
+    class_ids = {c.id for c in user.classes}
+
+    # Validate everything before touching the database
+    rows = []
+    results = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(event_row_from_payload(item, user.id, class_ids))
+            results.append({'index': index, 'success': True})
+        except ValueError as e:
+            results.append({'index': index, 'success': False, 'message': str(e)})
+
+    if not rows:
+        return jsonify({'success': False, 'message': 'No valid events', 'results': results}), 400
+
+    try:
+        # One executemany INSERT and one commit for the whole batch
+        ids = db.session.scalars(
+            insert(Event).returning(Event.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        bump_calendar_version(user.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error adding events batch: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error adding events'}), 500
+
+    created = iter(ids)
+    for result in results:
+        if result['success']:
+            result['id'] = next(created)
+
+    return jsonify({
+        'success': len(ids) == len(items),
+        'message': f'Added {len(ids)} of {len(items)} events',
+        'results': results
+    })
+
+def daily_capacity_from(data):
+    """Per-day study limit from the request, in hours."""
+    try:
+        hours = float(data.get('daily_hours') or DAILY_CAPACITY.total_seconds() / 3600)
+    except (TypeError, ValueError):
+        raise ValueError('daily_hours must be a number')
+    if not 0 < hours <= 24:
+        raise ValueError('daily_hours must be between 0 and 24')
+    return timedelta(hours=hours)
+
+def study_session_rows(user_id, sessions, title_format, class_id=None):
+    return [{
+        'title': title_format.format(title=s.assignment.title),
+        'description': f"Study session {s.days_before} days before {s.assignment.title}",
+        'date': s.start,
+        'user_id': user_id,
+        'class_id': class_id if class_id is not None else s.assignment.class_id,
+        'event_type': 'study_session',
+        'location': 'Study Location TBD'
+    } for s in sessions]
+
 @calendar_routes.route('/generate_schedule', methods=['POST'])
 @login_required
 def generate_schedule():
@@ -303,6 +641,10 @@ def generate_schedule():
         class_id = data.get('class_id')
         start_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d')
         end_date = datetime.strptime(data.get('end_date'), '%Y-%m-%d')
+        try:
+            daily_capacity = daily_capacity_from(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
         # Add timezone info
         start_date = start_date.replace(hour=0, minute=0, second=0)
@@ -323,7 +665,7 @@ def generate_schedule():
             Event.class_id == class_id,
             Event.event_type == 'study_session',
             Event.date.between(start_date, end_date)
-        ).delete()
+        ).delete(synchronize_session=False)
         
         # Get assignments in date range
         assignments = Event.query.filter(
@@ -339,37 +681,25 @@ def generate_schedule():
                 'message': 'No assignments found in selected date range'
             }), 404
         
-        study_sessions = []
-        current_time = datetime.now()
-        
-        for assignment in assignments:
-            # Create study sessions before each assignment
-            for days_before in [5, 3, 1]:
-                study_date = assignment.date - timedelta(days=days_before)
-                study_date = study_date.replace(hour=14, minute=0, second=0)  # Set to 2 PM
-                
-                # Skip if study date is in the past or outside range
-                if study_date < current_time or study_date < start_date or study_date > end_date:
-                    continue
-                
-                study_session = Event(
-                    title=f"Study Session for {assignment.title}",
-                    description=f"Study session {days_before} days before {assignment.title}",
-                    date=study_date,
-                    user_id=user.id,
-                    class_id=class_id,
-                    event_type='study_session',
-                    location='Study Location TBD'
-                )
-                
-                db.session.add(study_session)
-                study_sessions.append({
-                    'title': study_session.title,
-                    'date': study_date.strftime('%Y-%m-%d %H:%M:%S'),
-                    'type': 'study_session'
-                })
-        
+        # Everything else on the user's calendar is busy time
+        now = datetime.now()
+        busy = load_busy_indexes([user.id], max(start_date, now), end_date)[user.id]
+        # Sessions for other classes count towards the same daily cap
+        used = load_study_hours([user.id], max(start_date, now), end_date)[user.id]
+        planned = plan_study_sessions(assignments, busy, now, start_date, end_date,
+                                      daily_capacity=daily_capacity, used=used)
+
+        rows = study_session_rows(user.id, planned, 'Study Session for {title}', class_id)
+        if rows:
+            db.session.execute(insert(Event), rows)
+        bump_calendar_version(user.id)
         db.session.commit()
+
+        study_sessions = [{
+            'title': row['title'],
+            'date': row['date'].strftime('%Y-%m-%d %H:%M:%S'),
+            'type': 'study_session'
+        } for row in rows]
         
         return jsonify({
             'success': True,
@@ -395,6 +725,11 @@ def generate_smart_schedule():
             
         if not user.classes:
             return jsonify({'success': False, 'message': 'No classes found. Please add classes first.'}), 400
+
+        try:
+            daily_capacity = daily_capacity_from(request.get_json(silent=True) or {})
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
             
         now = datetime.now()
         end_date = now + timedelta(days=30)
@@ -413,37 +748,33 @@ def generate_smart_schedule():
             Event.user_id == user.id,
             Event.event_type == 'study_session',
             Event.date >= now
-        ).delete()
-
-        study_sessions = []
-        for assignment in assignments:
-            for days_before in [5, 3, 1]:
-                study_date = assignment.date - timedelta(days=days_before)
-                if study_date < now:
-                    continue
-                
-                study_session = Event(
-                    title=f"Study for {assignment.title}",
-                    description=f"Study session {days_before} days before {assignment.title}",
-                    date=study_date,
-                    user_id=user.id,
-                    class_id=assignment.class_id,
-                    event_type='study_session'
-                )
-                db.session.add(study_session)
-                study_sessions.append({
-                    'title': study_session.title,
-                    'date': study_date.strftime('%Y-%m-%d'),
-                    'type': 'study_session'
-                })
-        
+        ).delete(synchronize_session=False)
+
+        busy = load_busy_indexes([user.id], now, end_date)[user.id]
+        # Sessions kept from earlier today count towards today's cap
+        used = load_study_hours([user.id], now, end_date)[user.id]
+        planned = plan_study_sessions(assignments, busy, now, now, end_date,
+                                      daily_capacity=daily_capacity, used=used)
+
+        rows = study_session_rows(user.id, planned, 'Study for {title}')
+        if rows:
+            db.session.execute(insert(Event), rows)
+        bump_calendar_version(user.id)
         db.session.commit()
+
+        study_sessions = [{
+            'title': row['title'],
+            'date': row['date'].strftime('%Y-%m-%d'),
+            'type': 'study_session'
+        } for row in rows]
+
         return jsonify({
             'success': True,
             'message': f'Created {len(study_sessions)} study sessions',
             'study_sessions': study_sessions
         })
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Error generating smart schedule: {str(e)}")
         return jsonify({'success': False, 'message': 'An error occurred'}), 500
 
@@ -468,6 +799,90 @@ def get_student_schedule(student_id, class_id):
         logging.error(f"Error getting student schedule: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@calendar_routes.route('/common_free_time')
+@login_required
+def common_free_time():
+    try:
+        window_start, window_end = parse_date_window(request.args)
+        min_minutes = request.args.get('min_minutes', 60, type=int)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+    if window_start is None:
+        return jsonify({'error': 'start and end are required'}), 400
+    if window_end - window_start > MAX_FREE_TIME_RANGE:
+        return jsonify({'error': f'Range is limited to {MAX_FREE_TIME_RANGE.days} days'}), 400
+
+    try:
+        user_id = session['user_id']
+        class_id = request.args.get('class_id', type=int)
+        group_id = request.args.get('group_id', type=int)
+        if class_id:
+            member_query = db.session.query(user_classes.c.user_id).filter(
+                user_classes.c.class_id == class_id)
+        elif group_id:
+            member_query = db.session.query(study_group_members.c.user_id).filter(
+                study_group_members.c.group_id == group_id)
+        else:
+            return jsonify({'error': 'class_id or group_id is required'}), 400
+
+        member_ids = [member_id for (member_id,) in member_query]
+        if user_id not in member_ids:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        # One query for every member's events, then AND their free bitmaps
+        busy_by_user = load_busy_intervals(member_ids, window_start, window_end)
+        free = common_free_bitmap(busy_by_user, window_start, window_end)
+        min_slots = max(1, -(-min_minutes * 60 // int(SLOT.total_seconds())))
+
+        return jsonify({
+            'members': len(member_ids),
+            'slots': [{
+                'start': start.isoformat(),
+                'end': end.isoformat()
+            } for start, end in free_ranges(free, window_start, min_slots)]
+        })
+
+    except Exception as e:
+        logging.error(f"Error finding common free time: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@calendar_routes.route('/classes/<int:class_id>/generate_plans', methods=['POST'])
+@login_required
+def generate_class_plans(class_id):
+    try:
+        user = db.session.get(User, session['user_id'])
+        class_obj = db.session.get(Class, class_id)
+
+        if not class_obj or class_obj.created_by != user.id:
+            return jsonify({'success': False, 'message': 'Only the class creator can generate plans'}), 403
+
+        try:
+            daily_capacity = daily_capacity_from(request.get_json(silent=True) or {})
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        now = datetime.now()
+        job = job_queue.submit('class_study_plan', user.id, plan_class_study_sessions,
+                               class_id, now, now + timedelta(days=30),
+                               daily_capacity=daily_capacity)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('calendar.job_status', job_id=job.id)
+        }), 202
+
+    except Exception as e:
+        logging.error(f"Error queueing class plans: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error queueing study plans'}), 500
+
+@calendar_routes.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job or job.owner_id != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @calendar_routes.route('/import_canvas', methods=['POST'])
 @login_required
 def import_canvas():
@@ -484,7 +899,7 @@ def import_canvas():
             if 'canvas' not in canvas_url.lower():
                 return jsonify({'success': False, 'message': 'Not a valid Canvas URL'}), 400
                 
-            user.canvas_ical_url = canvas_url
+            user.set_canvas_url(canvas_url)
             db.session.commit()
         
         # Use saved URL if none provided
@@ -492,19 +907,14 @@ def import_canvas():
         if not url_to_use:
             return jsonify({'success': False, 'message': 'No Canvas URL configured'}), 400
             
-        # Import courses and events
-        success = fetch_canvas_courses(url_to_use, user)
-        if not success:
-            return jsonify({'success': False, 'message': 'Failed to import courses'}), 400
-            
-        success = fetch_canvas_events(url_to_use, user)
-        if not success:
-            return jsonify({'success': False, 'message': 'Failed to import events'}), 400
-            
+        # Download, parse and commit happen in the background
+        job = job_queue.submit('canvas_import', user.id, run_canvas_import, user.id, url_to_use)
         return jsonify({
             'success': True,
-            'message': 'Canvas data imported successfully'
-        })
+            'message': 'Canvas import started',
+            'job_id': job.id,
+            'status_url': url_for('calendar.import_status', job_id=job.id)
+        }), 202
         
     except Exception as e:
         logging.error(f"Canvas import error: {str(e)}")
@@ -513,6 +923,14 @@ def import_canvas():
             'message': 'Error importing Canvas data'
         }), 500
 
+@calendar_routes.route('/import_status/<job_id>')
+@login_required
+def import_status(job_id):
+    job = job_queue.get(job_id)
+    if not job or job.kind != 'canvas_import' or job.owner_id != session['user_id']:
+        return jsonify({'error': 'Import not found'}), 404
+    return jsonify(job.to_dict())
+
 def import_canvas_assignments():
     # Canvas API configuration
     CANVAS_URL = 'your_canvas_url'
@@ -575,15 +993,17 @@ def save_canvas_url():
                 'message': 'Not a valid Canvas URL'
             }), 400
             
-        user.canvas_ical_url = canvas_url
+        user.set_canvas_url(canvas_url)
         db.session.commit()
         
-        # Try to import courses immediately
-        success = fetch_canvas_courses(canvas_url, user)
+        # Courses and events are imported in the background
+        job = job_queue.submit('canvas_import', user.id, run_canvas_import, user.id, canvas_url)
         
         return jsonify({
             'success': True,
-            'message': 'Canvas URL saved successfully'
+            'message': 'Canvas URL saved successfully',
+            'job_id': job.id,
+            'status_url': url_for('calendar.import_status', job_id=job.id)
         })
         
     except Exception as e:
@@ -597,52 +1017,92 @@ def save_canvas_url():
 # Messaging Routes
 # --------------------------
 
+def serialize_message(message):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender_id': message.sender_id,
+        'timestamp': message.timestamp.isoformat(),
+        'time': message.timestamp.strftime('%I:%M %p')
+    }
+
+def encode_history_cursor(message):
+    raw = f'{message.timestamp.isoformat()}|{message.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor):
+    """Return (timestamp, id) from an opaque cursor; raises ValueError if malformed."""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+def chat_history_page(user_id, other_id, before=None, limit=CHAT_PAGE_SIZE):
+    """
+    The newest `limit` messages of a chat older than the `before` cursor, in
+    chronological order, plus the cursor for the page before them (or None).
+    Keyset pagination on (timestamp, id) so every page is an index range scan.
+    """
+    query = Message.query.filter(Message.conversation_key == Message.key_for(user_id, other_id))
+    if before:
+        timestamp, message_id = decode_history_cursor(before)
+        query = query.filter(or_(
+            Message.timestamp < timestamp,
+            and_(Message.timestamp == timestamp, Message.id < message_id)
+        ))
+    page = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+
+    cursor = encode_history_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit][::-1], cursor
+
 @message_routes.route('/')
 @message_routes.route('/<int:recipient_id>')
 @login_required
 def messages(recipient_id=None):
     try:
         user = db.session.get(User, session['user_id'])
-        friends = user.friends.all()
-        
-        # Get last messages for each friend
-        for friend in friends:
-            last_message = Message.query.filter(
-                ((Message.sender_id == user.id) & (Message.recipient_id == friend.id)) |
-                ((Message.sender_id == friend.id) & (Message.recipient_id == user.id))
-            ).order_by(Message.timestamp.desc()).first()
-            
-            if last_message:
-                friend.last_message = last_message.content
-                friend.unread_count = Message.query.filter_by(
-                    sender_id=friend.id,
-                    recipient_id=user.id,
-                    status='unread'
-                ).count()
+
+        # Friends and their conversation summaries in one indexed query,
+        # most recently active first
+        rows = (db.session.query(User, Conversation)
+                .join(friends_table, friends_table.c.friend_id == User.id)
+                .filter(friends_table.c.user_id == user.id)
+                .outerjoin(Conversation, or_(
+                    and_(Conversation.user_low_id == user.id, Conversation.user_high_id == User.id),
+                    and_(Conversation.user_low_id == User.id, Conversation.user_high_id == user.id)))
+                .order_by(Conversation.last_message_at.is_(None),
+                          Conversation.last_message_at.desc(),
+                          User.username)
+                .all())
+
+        friends = []
+        for friend, conversation in rows:
+            friend.last_message = conversation.last_preview if conversation else None
+            friend.unread_count = conversation.unread_for(user.id) if conversation else 0
+            friends.append(friend)
         
         chat_messages = []
+        history_cursor = None
         selected_recipient = None
         
         if recipient_id:
             selected_recipient = db.session.get(User, recipient_id)
             if selected_recipient:
-                chat_messages = Message.query.filter(
-                    ((Message.sender_id == user.id) & (Message.recipient_id == recipient_id)) |
-                    ((Message.sender_id == recipient_id) & (Message.recipient_id == user.id))
-                ).order_by(Message.timestamp).all()
+                # Only the newest page; older ones load on scroll
+                chat_messages, history_cursor = chat_history_page(user.id, recipient_id)
                 
                 # Mark messages as read
-                Message.query.filter_by(
-                    sender_id=recipient_id,
-                    recipient_id=user.id,
-                    status='unread'
-                ).update({'status': 'read'})
+                read = mark_conversation_read(user.id, recipient_id)
                 db.session.commit()
+                if read:
+                    push_unread_count(user.id)
         
         return render_template('messages.html',
                              user=user,
                              friends=friends,
                              chat_messages=chat_messages,
+                             history_cursor=history_cursor,
                              selected_recipient=selected_recipient)
                              
     except Exception as e:
@@ -650,6 +1110,21 @@ def messages(recipient_id=None):
         flash('Error accessing messages', 'error')
         return redirect(url_for('main.home'))
 
+@message_routes.route('/api/history/<int:recipient_id>')
+@login_required
+def chat_history(recipient_id):
+    try:
+        limit = min(max(request.args.get('limit', CHAT_PAGE_SIZE, type=int), 1), CHAT_PAGE_SIZE)
+        messages, cursor = chat_history_page(session['user_id'], recipient_id,
+                                             request.args.get('before'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'messages': [serialize_message(m) for m in messages],
+        'before': cursor,
+        'has_more': cursor is not None
+    })
+
 @message_routes.route('/connect/<int:peer_id>', methods=['POST'])
 @login_required
 def connect_with_peer(peer_id):
@@ -663,7 +1138,10 @@ def connect_with_peer(peer_id):
             message_type='connection_request'
         )
         db.session.add(connection)
+        # Requests count towards the unread badge but stay out of the chat summaries
+        add_unread_messages(peer_id, 1)
         db.session.commit()
+        push_unread_count(peer_id)
         return jsonify({'success': True})
     except Exception as e:
         logging.error(f"Connection error: {str(e)}")
@@ -673,11 +1151,7 @@ def connect_with_peer(peer_id):
 @login_required
 def get_unread_count():
     try:
-        user_id = session['user_id']
-        count = Message.query.filter_by(
-            recipient_id=user_id,
-            read=False
-        ).count()
+        count = unread_message_count(session['user_id'])
         return jsonify({'count': min(count, 99)})
     except Exception as e:
         logging.error(f"Error getting unread count: {str(e)}")
@@ -687,11 +1161,7 @@ def get_unread_count():
 @login_required
 def get_unread_message_count():
     try:
-        user_id = session['user_id']
-        count = Message.query.filter_by(
-            recipient_id=user_id,
-            status='unread'
-        ).count()
+        count = unread_message_count(session['user_id'])
         return jsonify({'count': min(count, 99)})
     except Exception as e:
         logging.error(f"Error getting unread count: {str(e)}")
@@ -716,7 +1186,9 @@ def send_message():
             timestamp=datetime.utcnow()
         )
         db.session.add(message)
+        record_message(message)
         db.session.commit()
+        push_unread_count(message.recipient_id)
         
         return jsonify({
             'success': True,
@@ -735,12 +1207,10 @@ def send_message():
 @login_required
 def mark_messages_read(sender_id):
     try:
-        Message.query.filter_by(
-            sender_id=sender_id,
-            recipient_id=session['user_id'],
-            status='unread'
-        ).update({'status': 'read'})
+        read = mark_conversation_read(session['user_id'], sender_id)
         db.session.commit()
+        if read:
+            push_unread_count(session['user_id'])
         return jsonify({'success': True})
     except Exception as e:
         logging.error(f"Error marking messages read: {str(e)}")
@@ -1034,18 +1504,11 @@ def profile():
     if request.method == 'POST':
         canvas_ical_url = request.form.get('canvas_ical_url')
         if canvas_ical_url:
-            user.canvas_ical_url = canvas_ical_url
+            user.set_canvas_url(canvas_ical_url)
             try:
-                # Import Canvas data
-                courses_success = fetch_canvas_courses(canvas_ical_url, user)
-                events_success = fetch_canvas_events(canvas_ical_url, user)
-                
                 db.session.commit()
-                
-                if courses_success and events_success:
-                    flash('Canvas URL updated and data imported successfully!', 'success')
-                else:
-                    flash('Canvas URL updated but there was an issue importing some data.', 'warning')
+                job_queue.submit('canvas_import', user.id, run_canvas_import, user.id, canvas_ical_url)
+                flash('Canvas URL updated. Your courses and events are being imported.', 'success')
             except Exception as e:
                 db.session.rollback()
                 flash('Error updating Canvas URL. Please try again.', 'error')
@@ -1091,11 +1554,28 @@ def get_notifications():
 @login_required
 def accept_connection(request_id):
     try:
-        request = Message.query.get(request_id)
-        request.status = 'accepted'
+        user_id = session['user_id']
+        connection = Message.query.filter_by(
+            id=request_id,
+            recipient_id=user_id,
+            message_type='connection_request'
+        ).first()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Request not found'}), 404
+
+        # Conditional, so accepting twice only takes the request off the badge once
+        was_unread = Message.query.filter_by(id=connection.id, status='unread').update(
+            {'status': 'accepted'}, synchronize_session=False)
+        if was_unread:
+            add_unread_messages(user_id, -1)
+        else:
+            connection.status = 'accepted'
         db.session.commit()
+        if was_unread:
+            push_unread_count(user_id)
         return jsonify({'success': True})
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Accept error: {str(e)}")
         return jsonify({'success': False}), 500
 
@@ -1318,6 +1798,7 @@ def manage_classes():
                         class_obj.archived = False
                         class_obj.archived_date = None
                         flash('Class restored successfully!', 'success')
+                    bump_class_calendar_versions(class_obj.id)
                     db.session.commit()
         
         active_classes = [c for c in user.classes if not c.archived]
@@ -1347,7 +1828,8 @@ def add_class():
             user = db.session.get(User, session['user_id'])
             new_class = Class(
                 name=class_name,
-                color=class_color
+                color=class_color,
+                created_by=user.id
             )
             db.session.add(new_class)
             user.classes.append(new_class)
@@ -1415,6 +1897,7 @@ def archive_class(class_id):
             
         class_.archived = True
         class_.archived_date = datetime.utcnow()
+        bump_class_calendar_versions(class_.id)
         db.session.commit()
         
         flash('Class archived successfully', 'success')
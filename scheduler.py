@@ -0,0 +1,215 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from sqlalchemy import insert
+from extensions import db
+from models import Event, user_classes
+from recurrence import event_occurrences
+from utils import event_window_filter, bump_calendar_version, EVENT_DURATION
+
+# Planned study block for one assignment
+StudySession = namedtuple('StudySession', ['assignment', 'start', 'end', 'days_before'])
+
+# Shared assignment used when planning a whole class at once
+ClassAssignment = namedtuple('ClassAssignment', ['title', 'date', 'class_id'])
+
+# Preferred spacing of sessions ahead of a due date
+LEAD_DAYS = (5, 3, 1)
+# Rows per executemany INSERT when writing plans for many users
+INSERT_CHUNK = 1000
+SESSION_LENGTH = timedelta(hours=1)
+DAILY_CAPACITY = timedelta(hours=3)
+DAY_START = time(9, 0)
+DAY_END = time(21, 0)
+
+
+class BusyIndex:
+    """
+    Sorted, non-overlapping busy intervals. Lookups are binary searches
+    over the interval starts.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def next_free(self, start, length, limit):
+        """Earliest start >= `start` with `length` free before `limit`, or None."""
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            start = self.ends[i]
+        i += 1
+        while start + length <= limit:
+            if i >= len(self.starts) or self.starts[i] >= start + length:
+                return start
+            start = max(start, self.ends[i])
+            i += 1
+        return None
+
+    def add(self, start, end):
+        """Mark [start, end) busy; the caller only adds free intervals."""
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+
+def load_busy_intervals(user_ids, start, end):
+    """Busy (start, end) intervals per user from their events in [start, end), in one query."""
+    intervals = {user_id: [] for user_id in user_ids}
+    events = Event.query.filter(
+        Event.user_id.in_(user_ids),
+        event_window_filter(start, end)
+    ).all()
+    for event in events:
+        for occurrence in event_occurrences(event, start - EVENT_DURATION, end):
+            intervals[event.user_id].append((occurrence, occurrence + EVENT_DURATION))
+    return intervals
+
+
+def load_busy_indexes(user_ids, start, end):
+    """Build a BusyIndex per user from their events in [start, end)."""
+    intervals = load_busy_intervals(user_ids, start, end)
+    return {user_id: BusyIndex(intervals[user_id]) for user_id in user_ids}
+
+
+def load_study_hours(user_ids, start, end, session_length=SESSION_LENGTH):
+    """
+    Study time per user and day from the study sessions already on their
+    calendars in [start, end), in one query. Counts whole days, so sessions
+    earlier on the first day still count towards it.
+    """
+    start = datetime.combine(start.date(), time.min)
+    used = {user_id: defaultdict(timedelta) for user_id in user_ids}
+    events = Event.query.filter(
+        Event.user_id.in_(user_ids),
+        Event.event_type == 'study_session',
+        event_window_filter(start, end)
+    ).all()
+    for event in events:
+        for occurrence in event_occurrences(event, start, end):
+            if start <= occurrence < end:
+                used[event.user_id][occurrence.date()] += session_length
+    return used
+
+
+def plan_study_sessions(assignments, busy, now, window_start=None, window_end=None,
+                        daily_capacity=DAILY_CAPACITY, session_length=SESSION_LENGTH,
+                        lead_days=LEAD_DAYS, used=None):
+    """
+    Greedily place study sessions ahead of each assignment, earliest due date
+    first. Each session goes on the free slot closest to its preferred day
+    (`days_before` the due date), never overlapping `busy` or another
+    session, never ending after the due time, and never pushing a day past
+    `daily_capacity`, counting the study time already in `used` (day ->
+    timedelta, see load_study_hours). Assignments need a `date` attribute.
+    """
+    earliest = max(now, window_start) if window_start else now
+    used = defaultdict(timedelta, used or {})
+    planned = []
+
+    for assignment in sorted(assignments, key=lambda a: a.date):
+        due = assignment.date
+        latest = min(due, window_end) if window_end else due
+        taken_days = set()
+
+        for days_before in lead_days:
+            preferred = (due - timedelta(days=days_before)).date()
+            for day in nearest_days(preferred, earliest.date(), latest.date(), taken_days):
+                if used[day] + session_length > daily_capacity:
+                    continue
+                day_open = max(datetime.combine(day, DAY_START), earliest)
+                day_close = min(datetime.combine(day, DAY_END), latest)
+                slot = busy.next_free(day_open, session_length, day_close)
+                if slot is None:
+                    continue
+
+                busy.add(slot, slot + session_length)
+                used[day] += session_length
+                taken_days.add(day)
+                planned.append(StudySession(assignment, slot, slot + session_length, days_before))
+                break
+
+    return planned
+
+
+def nearest_days(preferred, first, last, skip=()):
+    """Days in [first, last] ordered by distance from `preferred`, later first on ties."""
+    if first > last:
+        return
+    preferred = min(max(preferred, first), last)
+    for offset in range((last - first).days + 1):
+        for day in (preferred + timedelta(days=offset), preferred - timedelta(days=offset)):
+            if first <= day <= last and day not in skip:
+                yield day
+            if offset == 0:
+                break
+
+
+def plan_class_study_sessions(job, class_id, now, end, daily_capacity=DAILY_CAPACITY):
+    """
+    Replace the upcoming study sessions of every student in a class.
+    Assignments and busy time are each loaded once for the whole class,
+    and sessions are written in chunked bulk inserts. Reports progress
+    on `job` per student.
+    """
+    student_ids = [user_id for (user_id,) in db.session.query(user_classes.c.user_id)
+                   .filter(user_classes.c.class_id == class_id)]
+
+    # Each student has their own copy of an assignment; plan against the distinct set
+    rows = (db.session.query(Event.title, Event.date)
+            .filter(Event.class_id == class_id,
+                    Event.event_type == 'assignment',
+                    Event.date >= now,
+                    Event.date <= end)
+            .distinct())
+    assignments = [ClassAssignment(title, date, class_id) for title, date in rows]
+
+    job.progress(0, len(student_ids))
+    if not student_ids or not assignments:
+        return {'students': len(student_ids), 'assignments': len(assignments), 'sessions': 0}
+
+    Event.query.filter(
+        Event.user_id.in_(student_ids),
+        Event.class_id == class_id,
+        Event.event_type == 'study_session',
+        Event.date >= now
+    ).delete(synchronize_session=False)
+
+    busy = load_busy_indexes(student_ids, now, end)
+    # Sessions for the students' other classes count towards the same daily cap
+    used = load_study_hours(student_ids, now, end)
+    pending = []
+    created = 0
+    for done, student_id in enumerate(student_ids, start=1):
+        for s in plan_study_sessions(assignments, busy[student_id], now, now, end,
+                                     daily_capacity=daily_capacity, used=used[student_id]):
+            pending.append({
+                'title': f"Study for {s.assignment.title}",
+                'description': f"Study session {s.days_before} days before {s.assignment.title}",
+                'date': s.start,
+                'user_id': student_id,
+                'class_id': class_id,
+                'event_type': 'study_session'
+            })
+        if len(pending) >= INSERT_CHUNK:
+            db.session.execute(insert(Event), pending)
+            created += len(pending)
+            pending = []
+        job.progress(done)
+
+    if pending:
+        db.session.execute(insert(Event), pending)
+        created += len(pending)
+    bump_calendar_version(*student_ids)
+    db.session.commit()
+
+    return {'students': len(student_ids), 'assignments': len(assignments), 'sessions': created}
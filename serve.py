@@ -0,0 +1,152 @@
+"""
+Production entry point: runs several Socket.IO server processes on
+consecutive ports, sharing a message queue so emits to a user's room
+reach them whichever process holds their connection, plus one
+background process for the Canvas sync loop and job workers.
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python serve.py --workers 4 --port 5001
+
+Server processes need eventlet or gevent (reqs.txt); --allow-werkzeug
+runs the development server instead, for local testing only. Put the
+ports behind a proxy with sticky sessions (README, "Running multiple
+workers").
+"""
+import os
+
+# Set by start() for the server process it launches, which imports this
+# module first: the stdlib is patched before anything else is imported
+PATCHED = os.environ.pop('SERVE_MONKEY_PATCH', None)
+if PATCHED == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif PATCHED == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import secrets
+import time
+
+ASYNC_MODES = ('eventlet', 'gevent')
+
+
+def async_mode(allow_werkzeug=False):
+    """The first installed async server, or 'threading' when explicitly allowed."""
+    for mode in ASYNC_MODES:
+        if importlib.util.find_spec(mode) is not None:
+            return mode
+    if allow_werkzeug:
+        return 'threading'
+    raise RuntimeError('serve.py needs eventlet or gevent (pip install -r reqs.txt); '
+                       'pass --allow-werkzeug to run the development server instead')
+
+
+def run_worker(host, port, mode, log_level='INFO', background=True):
+    """Serve the app on one port; `background` also runs sync and jobs here."""
+    if mode in ASYNC_MODES and PATCHED != mode:
+        raise RuntimeError(f'{mode} workers must be launched with start(..., patch={mode!r})')
+    os.environ['SOCKETIO_ASYNC_MODE'] = mode
+    if not background:
+        # Left to the one background process, so each sync and job runs once
+        os.environ['CANVAS_SYNC_ENABLED'] = '0'
+        os.environ['JOB_WORKERS'] = '0'
+
+    # Imported here so every process builds its own app and queue connection
+    from app import app
+    from routes import socketio
+    logging.getLogger().setLevel(log_level)
+    logging.getLogger('werkzeug').setLevel(log_level)
+    socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=mode == 'threading')
+
+
+def run_background(log_level='INFO'):
+    """Canvas sync loop and job workers; emits reach clients through the queue."""
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+    from app import app  # init_jobs and init_canvas_sync start the threads
+    logging.getLogger().setLevel(log_level)
+    if app.config['JOB_WORKERS'] == 0:
+        logging.warning("JOB_WORKERS is 0; jobs wait for 'flask jobs-worker'")
+    while True:
+        time.sleep(60)
+
+
+def start(target, *args, name, patch=None):
+    """
+    Run `target(*args)` in a fresh process. `patch` ('eventlet' or
+    'gevent') monkey-patches that process before it imports the app.
+    """
+    process = multiprocessing.get_context('spawn').Process(
+        target=target, args=args, name=name, daemon=True)
+    # The spawned process inherits the environment as it is at start()
+    if patch in ASYNC_MODES:
+        os.environ['SERVE_MONKEY_PATCH'] = patch
+    try:
+        process.start()
+    finally:
+        os.environ.pop('SERVE_MONKEY_PATCH', None)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000, help='First port; worker i listens on port + i.')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', 1)))
+    parser.add_argument('--allow-werkzeug', action='store_true',
+                        help='Fall back to the development server without eventlet or gevent.')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+    mode = async_mode(args.allow_werkzeug)
+
+    if args.workers == 1:
+        # Still a fresh process, which this one has imported too much to patch
+        process = start(run_worker, args.host, args.port, mode, args.log_level,
+                        name=f'timely-web-{args.port}', patch=mode)
+        try:
+            process.join()
+        except KeyboardInterrupt:
+            process.terminate()
+            process.join()
+        return
+
+    if not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+        logging.warning("SOCKETIO_MESSAGE_QUEUE is not set; using the local queue, "
+                        "which only reaches processes on this host")
+        os.environ['SOCKETIO_MESSAGE_QUEUE'] = 'local'
+    if not os.getenv('FLASK_SECRET_KEY'):
+        # Sessions must verify in every worker; they will not survive a restart
+        logging.warning("FLASK_SECRET_KEY is not set; generating one for this run")
+        os.environ['FLASK_SECRET_KEY'] = secrets.token_hex(16)
+    if os.getenv('JOB_QUEUE_TYPE', 'thread') != 'local':
+        # Jobs run in the background process, so status must be shared
+        logging.warning("Using JOB_QUEUE_TYPE=local so every worker sees background jobs")
+        os.environ['JOB_QUEUE_TYPE'] = 'local'
+
+    def launch(port):
+        if port is None:
+            return start(run_background, args.log_level, name='timely-background')
+        return start(run_worker, args.host, port, mode, args.log_level, False,
+                     name=f'timely-web-{port}', patch=mode)
+
+    processes = {port: launch(port) for port in
+                 [None] + [args.port + i for i in range(args.workers)]}
+    try:
+        while True:
+            time.sleep(1)
+            for port, process in processes.items():
+                if not process.is_alive():
+                    logging.error(f"{process.name} exited with {process.exitcode}; restarting")
+                    processes[port] = launch(port)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
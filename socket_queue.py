@@ -0,0 +1,98 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import socketio
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    Socket.IO message queue in a local SQLite file, standing in for Redis
+    or another broker: every server process on the host publishes emits
+    and room changes to a shared table and relays the ones addressed to
+    its own clients, so a user_<id> emit reaches the user whichever worker
+    they are connected to. Write-only instances let job workers emit too.
+    """
+
+    name = 'local'
+
+    def __init__(self, path, channel='flask-socketio', write_only=False, logger=None,
+                 json=None, poll_interval=0.05, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._published = 0
+        self._closed = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            # WAL lets the listeners poll while another process publishes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS socketio_messages ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                'created_at REAL NOT NULL, payload TEXT NOT NULL)'
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _publish(self, data):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO socketio_messages (channel, created_at, payload) VALUES (?, ?, ?)',
+                (self.channel, now, self.json.dumps(data))
+            )
+            self._published += 1
+            # Listeners only read new rows; old ones are kept briefly and then dropped
+            if self._published % 100 == 0:
+                conn.execute('DELETE FROM socketio_messages WHERE created_at < ?',
+                             (now - self.retention,))
+        finally:
+            conn.close()
+
+    def _listen(self):
+        conn = None
+        last = None
+        while not self._closed.is_set():
+            try:
+                if conn is None:
+                    conn = self._connect()
+                if last is None:
+                    # Start from now; messages published before this process joined are not replayed
+                    last = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+                rows = conn.execute(
+                    'SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id',
+                    (last, self.channel)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logging.error(f"Socket.IO queue unavailable: {str(e)}")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                rows = []
+
+            for message_id, payload in rows:
+                last = message_id
+                yield payload
+            if not rows:
+                self._sleep(self.poll_interval)
+        if conn is not None:
+            conn.close()
+
+    def _sleep(self, seconds):
+        if self.server is not None:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def close(self):
+        """Stop the listener; used by tests and the load test."""
+        self._closed.set()
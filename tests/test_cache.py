@@ -0,0 +1,62 @@
+# Run from the repository root:
+# python -m unittest discover -s tests -p "test_cache.py"
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from cache import LRUCache, KeyValueCache, FeedCache
+
+
+class LRUCacheTestCases(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=10)
+        with patch('cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with patch('cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class KeyValueCacheTestCases(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_entries_shared_between_instances(self):
+        KeyValueCache(self.path).set('1:0:a', b'[]')
+        other = KeyValueCache(self.path)
+        self.assertEqual(other.get('1:0:a'), b'[]')
+
+        other.delete_prefix('1:')
+        self.assertIsNone(KeyValueCache(self.path).get('1:0:a'))
+
+
+class FeedCacheTestCases(unittest.TestCase):
+    def test_invalidate_user_only_drops_that_user(self):
+        cache = FeedCache(LRUCache())
+        cache.set(FeedCache.key(1, 0, 'w'), 'one')
+        cache.set(FeedCache.key(12, 0, 'w'), 'twelve')
+        cache.invalidate_user(1)
+
+        self.assertIsNone(cache.get(FeedCache.key(1, 0, 'w')))
+        self.assertEqual(cache.get(FeedCache.key(12, 0, 'w')), 'twelve')
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+# Run from the repository root:
+# python -m unittest discover -s tests -p "test_calendar.py"
+
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import unittest
+from datetime import datetime
+from icalendar import Calendar
+from app import app
+from extensions import db
+from models import User, Class, Event
+from cache import feed_cache
+
+
+class CalendarFeedTestCases(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        feed_cache.backend.clear()
+        self.client = app.test_client()
+
+        self.user = User(username='feeduser', email='feed@example.com', password='x')
+        self.class_ = Class(name='CSE-110', color='#123456')
+        self.user.classes.append(self.class_)
+        db.session.add_all([self.user, self.class_])
+        db.session.commit()
+
+        with self.client.session_transaction() as session:
+            session['user_id'] = self.user.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_event(self, title, date, class_id=None, event_type='assignment'):
+        event = Event(title=title, date=date, user_id=self.user.id,
+                      class_id=class_id, event_type=event_type)
+        db.session.add(event)
+        db.session.commit()
+        return event
+
+    def test_events_without_window_returns_everything(self):
+        self.add_event('Old', datetime(2024, 1, 10, 9), self.class_.id)
+        self.add_event('New', datetime(2024, 11, 10, 9), self.class_.id)
+
+        response = self.client.get('/calendar/events')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e['title'] for e in response.get_json()], ['Old', 'New'])
+
+    def test_events_window_filters_by_date(self):
+        self.add_event('Before', datetime(2024, 9, 30, 9), self.class_.id)
+        self.add_event('Inside', datetime(2024, 10, 15, 9), self.class_.id)
+        self.add_event('Overlapping', datetime(2024, 9, 30, 23, 30), self.class_.id)
+        self.add_event('After', datetime(2024, 11, 1, 0), self.class_.id)
+
+        response = self.client.get('/calendar/events', query_string={
+            'start': '2024-10-01T00:00:00-07:00',
+            'end': '2024-11-01T00:00:00-07:00'
+        })
+        titles = [e['title'] for e in response.get_json()]
+        self.assertEqual(titles, ['Overlapping', 'Inside'])
+
+    def test_events_window_skips_archived_classes(self):
+        archived = Class(name='OLD-100', archived=True)
+        self.user.classes.append(archived)
+        db.session.commit()
+        self.add_event('Archived', datetime(2024, 10, 15, 9), archived.id)
+        self.add_event('Canvas', datetime(2024, 10, 16, 9))
+
+        response = self.client.get('/calendar/events', query_string={
+            'start': '2024-10-01', 'end': '2024-11-01'
+        })
+        events = response.get_json()
+        self.assertEqual([e['title'] for e in events], ['Canvas'])
+        self.assertEqual(events[0]['backgroundColor'], '#808080')
+
+    def test_events_invalid_window(self):
+        response = self.client.get('/calendar/events', query_string={
+            'start': 'yesterday', 'end': '2024-11-01'
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_events_not_modified_until_version_bumps(self):
+        window = {'start': '2024-10-01', 'end': '2024-11-01'}
+        self.add_event('Inside', datetime(2024, 10, 15, 9), self.class_.id)
+
+        first = self.client.get('/calendar/events', query_string=window)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+
+        cached = self.client.get('/calendar/events', query_string=window,
+                                 headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+
+        response = self.client.post('/calendar/add_event', json={
+            'title': 'Quiz', 'date': '2024-10-20T10:00:00', 'class_id': self.class_.id
+        })
+        self.assertTrue(response.get_json()['success'])
+
+        changed = self.client.get('/calendar/events', query_string=window,
+                                  headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertEqual(len(changed.get_json()), 2)
+
+    def test_feed_served_from_cache_until_invalidated(self):
+        window = {'start': '2024-10-01', 'end': '2024-11-01'}
+        self.add_event('Inside', datetime(2024, 10, 15, 9), self.class_.id)
+
+        hits = feed_cache.hits
+        self.client.get('/calendar/events', query_string=window)
+        self.client.get('/calendar/events', query_string=window)
+        self.assertEqual(feed_cache.hits, hits + 1)
+        self.assertEqual(len(feed_cache.backend), 1)
+
+        self.client.post('/calendar/add_event', json={
+            'title': 'Quiz', 'date': '2024-10-20T10:00:00', 'class_id': self.class_.id
+        })
+        self.assertEqual(len(feed_cache.backend), 0)
+        response = self.client.get('/calendar/events', query_string=window)
+        self.assertEqual(len(response.get_json()), 2)
+
+        stats = self.client.get('/calendar/cache_stats').get_json()
+        self.assertEqual(stats['backend'], 'LRUCache')
+        self.assertGreaterEqual(stats['misses'], 2)
+
+    def test_add_event_batch_inserts_valid_items(self):
+        response = self.client.post('/calendar/add_event', json=[
+            {'title': 'HW 1', 'date': '2024-10-01T23:59:00', 'class_id': self.class_.id},
+            {'title': 'HW 2', 'date': 'not a date'},
+            {'title': 'HW 3', 'date': '2024-10-15T23:59:00', 'event_type': 'exam'},
+            {'title': 'HW 4', 'date': '2024-10-20T23:59:00', 'class_id': 9999},
+        ])
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(data['success'])
+        self.assertEqual([r['success'] for r in data['results']], [True, False, True, False])
+
+        saved = Event.query.order_by(Event.date).all()
+        self.assertEqual([e.title for e in saved], ['HW 1', 'HW 3'])
+        self.assertEqual([r.get('id') for r in data['results'] if r['success']],
+                         [e.id for e in saved])
+        self.assertEqual(saved[1].event_type, 'exam')
+        self.assertEqual(saved[1].status, 'pending')
+
+    def test_add_event_batch_rejects_non_string_titles(self):
+        response = self.client.post('/calendar/add_event', json=[
+            {'title': 42, 'date': '2024-10-01T23:59:00'},
+            {'title': {'text': 'HW'}, 'date': '2024-10-02T23:59:00'},
+            {'title': 'HW 3', 'date': '2024-10-03T23:59:00'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([r['success'] for r in results], [False, False, True])
+        self.assertEqual(results[0]['message'], 'Invalid title')
+        self.assertEqual([e.title for e in Event.query.all()], ['HW 3'])
+
+    def test_add_event_batch_rejects_invalid_optional_fields(self):
+        response = self.client.post('/calendar/add_event', json=[
+            {'title': 'HW 1', 'date': '2024-10-01T23:59:00', 'description': {'x': 1}},
+            {'title': 'HW 2', 'date': '2024-10-02T23:59:00', 'location': 'x' * 101},
+            {'title': 'HW 3', 'date': '2024-10-03T23:59:00', 'event_type': 'x' * 51},
+            {'title': 'HW 4', 'date': '2024-10-04T23:59:00', 'class_id': True},
+            {'title': 'HW 5', 'date': '2024-10-05T23:59:00', 'rrule': ['FREQ=DAILY']},
+            {'title': 'HW 6', 'date': '2024-10-06T23:59:00', 'location': 'Library'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([r['success'] for r in results], [False] * 5 + [True])
+        self.assertEqual(results[0]['message'], 'Invalid description')
+        self.assertEqual(results[1]['message'], 'Location is too long')
+        self.assertEqual([e.location for e in Event.query.all()], ['Library'])
+
+    def test_add_event_batch_rejects_oversized_and_empty(self):
+        response = self.client.post('/calendar/add_event', json=[])
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/calendar/add_event', json=[{'title': 'x'}] * 501)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Event.query.count(), 0)
+
+    def test_recurring_event_expanded_per_window(self):
+        response = self.client.post('/calendar/add_event', json={
+            'title': 'Lecture', 'date': '2024-09-02T10:00:00', 'class_id': self.class_.id,
+            'rrule': 'FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20241211T235959',
+            'exdates': ['2024-10-14T10:00:00']
+        })
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(Event.query.count(), 1)
+
+        response = self.client.get('/calendar/events', query_string={
+            'start': '2024-10-07', 'end': '2024-10-21'
+        })
+        starts = [e['start'] for e in response.get_json()]
+        self.assertEqual(starts, ['2024-10-07T10:00:00', '2024-10-09T10:00:00',
+                                  '2024-10-16T10:00:00'])
+
+        response = self.client.get('/calendar/events', query_string={
+            'start': '2025-01-01', 'end': '2025-02-01'
+        })
+        self.assertEqual(response.get_json(), [])
+
+    def test_long_series_end_is_not_capped(self):
+        response = self.client.post('/calendar/add_event', json={
+            'title': 'Standup', 'date': '2024-01-01T09:00:00',
+            'rrule': 'FREQ=DAILY;UNTIL=20260101T090000'
+        })
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(Event.query.one().recurrence_end, datetime(2026, 1, 1, 9, 0))
+
+        response = self.client.get('/calendar/events', query_string={
+            'start': '2025-12-01', 'end': '2025-12-08'
+        })
+        self.assertEqual(len(response.get_json()), 7)
+
+    def test_unexpandable_series_does_not_hide_other_events(self):
+        self.add_event('Quiz', datetime(2024, 10, 2, 9, 0))
+        db.session.add(Event(title='Broken', date=datetime(2024, 10, 1, 9, 0), user_id=self.user.id,
+                             rrule='FREQ=WEEKLY;BYDAY=XX'))
+        db.session.commit()
+
+        response = self.client.get('/calendar/events', query_string={
+            'start': '2024-10-01', 'end': '2024-10-31'
+        })
+        self.assertEqual([e['title'] for e in response.get_json()], ['Quiz'])
+
+    def test_invalid_recurrence_rule_rejected(self):
+        response = self.client.post('/calendar/add_event', json={
+            'title': 'Lecture', 'date': '2024-09-02T10:00:00', 'rrule': 'FREQ=SOMETIMES'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Event.query.count(), 0)
+
+    def test_unbounded_recurrence_rules_rejected(self):
+        for rule in ('FREQ=SECONDLY;COUNT=3', 'FREQ=HOURLY', 'FREQ=DAILY;COUNT=1001',
+                     'FREQ=DAILY;BYMINUTE=0,30'):
+            response = self.client.post('/calendar/add_event', json={
+                'title': 'Ping', 'date': '2024-09-02T10:00:00', 'rrule': rule
+            })
+            self.assertEqual(response.status_code, 400, rule)
+        self.assertEqual(Event.query.count(), 0)
+
+        response = self.client.post('/calendar/add_event', json={
+            'title': 'Lecture', 'date': '2024-09-02T10:00:00', 'rrule': 'FREQ=DAILY;COUNT=1000'
+        })
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(Event.query.one().recurrence_end, datetime(2027, 5, 29, 10, 0))
+
+    def test_calendar_page_renders_shell(self):
+        response = self.client.get('/calendar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'CSE-110', response.data)
+        self.assertIn(b'data-class-id', response.data)
+
+    def test_classmates_paginated(self):
+        for i in range(3):
+            classmate = User(username=f'mate{i}', email=f'mate{i}@example.com', password='x')
+            classmate.classes.append(self.class_)
+            db.session.add(classmate)
+        db.session.commit()
+
+        url = f'/calendar/classmates/{self.class_.id}'
+        first = self.client.get(url, query_string={'per_page': 2}).get_json()
+        self.assertEqual([c['username'] for c in first['classmates']], ['mate0', 'mate1'])
+        self.assertTrue(first['has_next'])
+
+        second = self.client.get(url, query_string={'per_page': 2, 'page': 2}).get_json()
+        self.assertEqual([c['username'] for c in second['classmates']], ['mate2'])
+        self.assertFalse(second['has_next'])
+
+    def test_classmates_requires_enrollment(self):
+        other = Class(name='PHY-121')
+        db.session.add(other)
+        db.session.commit()
+        response = self.client.get(f'/calendar/classmates/{other.id}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_ical_feed_streams_events(self):
+        self.add_event('Essay, draft; v2', datetime(2024, 10, 15, 9), self.class_.id)
+        self.client.post('/calendar/add_event', json={
+            'title': 'Lecture', 'date': '2024-09-02T10:00:00',
+            'rrule': 'FREQ=WEEKLY;COUNT=10', 'description': 'x' * 200
+        })
+        url = self.client.post('/calendar/feed_token').get_json()['url']
+        feed_path = url.replace('http://localhost', '')
+
+        response = self.client.get(feed_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/calendar')
+        self.assertTrue(all(len(line.encode()) <= 75 for line in response.text.split('\r\n')))
+
+        vevents = Calendar.from_ical(response.data).walk('VEVENT')
+        self.assertEqual([str(e['SUMMARY']) for e in vevents], ['Lecture', 'Essay, draft; v2'])
+        self.assertEqual(vevents[0]['RRULE']['COUNT'], [10])
+        self.assertEqual(vevents[0]['DTSTAMP'].dt.tzinfo.utcoffset(None).total_seconds(), 0)
+        self.assertIsNone(vevents[0]['DTSTART'].dt.tzinfo)
+
+        cached = self.client.get(feed_path, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        since = self.client.get(feed_path, headers={'If-Modified-Since': response.headers['Last-Modified']})
+        self.assertEqual(since.status_code, 304)
+
+        hits = feed_cache.hits
+        self.assertEqual(self.client.get(feed_path).data, response.data)
+        self.assertEqual(feed_cache.hits, hits + 1)
+
+    def test_ical_feed_unknown_token(self):
+        self.assertEqual(self.client.get('/calendar/feed/nope.ics').status_code, 404)
+
+    def test_archiving_class_bumps_version(self):
+        self.add_event('Inside', datetime(2024, 10, 15, 9), self.class_.id)
+        version = self.user.calendar_version
+
+        self.client.post('/classes/manage', data={
+            'class_id': self.class_.id, 'action': 'archive'
+        })
+        db.session.refresh(self.user)
+        self.assertEqual(self.user.calendar_version, version + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
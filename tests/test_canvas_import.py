@@ -0,0 +1,555 @@
+# Run from the repository root:
+# python -m unittest discover -s tests -p "test_canvas_import.py"
+
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import hashlib
+import tempfile
+import threading
+import time
+import unittest
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch, MagicMock
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from app import app
+from extensions import db
+from models import User, Class, Event
+from utils import (import_canvas_feed, parse_ical_data, sync_canvas_events, enroll_canvas_courses,
+                   iter_canvas_events)
+from canvas_sync import CanvasSyncService
+from ical_parser import iter_vevents
+from http_client import HTTPClient, ResponseTooLarge
+from jobs import JobQueue, LocalBroker, job_queue
+
+FEED = (
+    'BEGIN:VCALENDAR\r\n'
+    'VERSION:2.0\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:event-assignment-1\r\n'
+    'SUMMARY:Homework 1 [CSE-110]\r\n'
+    'DTSTART:20241001T235900\r\n'
+    'END:VEVENT\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:event-assignment-2\r\n'
+    'SUMMARY:Lab report\r\n'
+    'DESCRIPTION:Course: MAT-265 Calculus\r\n'
+    'DTSTART:20241003T120000\r\n'
+    'END:VEVENT\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:event-assignment-3\r\n'
+    'SUMMARY:Homework 2 [CSE-110]\r\n'
+    'DTSTART:20241008T235900\r\n'
+    'END:VEVENT\r\n'
+    'END:VCALENDAR\r\n'
+).encode()
+
+
+def feed_response(content=FEED, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+
+class FeedServer:
+    """Local HTTP stand-in for Canvas serving iCal bodies with ETags."""
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.requests = []
+        # path -> number of 503s to answer before serving the feed
+        self.failures = {}
+        # path -> seconds to stall before answering
+        self.delays = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                time.sleep(server.delays.get(self.path, 0))
+                if server.failures.get(self.path):
+                    server.failures[self.path] -= 1
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.feeds.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/calendar')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class CanvasImportTestCases(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='canvas', email='canvas@example.com', password='x')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_parse_ical_data_finds_courses(self):
+        events = parse_ical_data(FEED)
+        self.assertEqual([e['course'] for e in events], ['CSE-110', 'MAT-265', 'CSE-110'])
+
+    def test_streaming_parser_matches_calendar_parser(self):
+        streamed = list(iter_canvas_events(FEED))
+        self.assertEqual([e.pop('uid') for e in streamed],
+                         ['event-assignment-1', 'event-assignment-2', 'event-assignment-3'])
+        self.assertEqual(streamed, parse_ical_data(FEED))
+
+    def test_streaming_parser_handles_folding_and_values(self):
+        feed = (
+            'BEGIN:VCALENDAR\r\n'
+            'BEGIN:VEVENT\r\n'
+            'UID:folded\r\n'
+            'SUMMARY:A very long assignment title that keeps going past the seventy-\r\n'
+            ' five octet limit [CSE-110]\r\n'
+            'DESCRIPTION:Line one\\nCourse: MAT-265\\, Calculus\\; notes\r\n'
+            'DTSTART;TZID=America/Phoenix:20241001T090000\r\n'
+            'RRULE:FREQ=WEEKLY;COUNT=3\r\n'
+            'EXDATE;TZID=America/Phoenix:20241008T090000,20241015T090000\r\n'
+            'BEGIN:VALARM\r\n'
+            'DESCRIPTION:Reminder\r\n'
+            'END:VALARM\r\n'
+            'END:VEVENT\r\n'
+            'BEGIN:VEVENT\r\n'
+            'SUMMARY:Holiday\r\n'
+            'DTSTART;VALUE=DATE:20241111\r\n'
+            'END:VEVENT\r\n'
+            'BEGIN:VEVENT\r\n'
+            'SUMMARY:No start\r\n'
+            'END:VEVENT\r\n'
+            'END:VCALENDAR\r\n'
+        ).encode()
+
+        first, holiday = iter_vevents(feed)
+        self.assertEqual(first['title'], 'A very long assignment title that keeps going past the '
+                                         'seventy-five octet limit [CSE-110]')
+        self.assertEqual(first['description'], 'Line one\nCourse: MAT-265, Calculus; notes')
+        self.assertEqual(first['date'].replace(tzinfo=None), datetime(2024, 10, 1, 9, 0))
+        self.assertEqual(first['date'].utcoffset(), timedelta(hours=-7))
+        self.assertEqual(first['rrule'], 'FREQ=WEEKLY;COUNT=3')
+        self.assertEqual(len(first['exdates']), 2)
+        self.assertEqual(holiday['date'], datetime(2024, 11, 11).date())
+
+    def test_streaming_parser_accepts_line_iterables(self):
+        lines = iter(FEED.splitlines(keepends=True))
+        self.assertEqual(len(list(iter_vevents(lines))), 3)
+
+    @patch('utils.http_client.get', return_value=feed_response())
+    def test_import_downloads_once_and_links_classes(self, mock_get):
+        result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual((result.courses, result.events), (2, 3))
+        self.assertEqual(sorted(c.name for c in self.user.classes), ['CSE-110', 'MAT-265'])
+
+        cse = Class.query.filter_by(name='CSE-110').one()
+        homework = Event.query.filter_by(class_id=cse.id).order_by(Event.date).all()
+        self.assertEqual([e.title for e in homework], ['Homework 1 [CSE-110]', 'Homework 2 [CSE-110]'])
+
+    def test_import_mixes_all_day_and_timed_events(self):
+        feed = FEED.replace(b'END:VCALENDAR\r\n', (
+            'BEGIN:VEVENT\r\n'
+            'UID:event-exam-day\r\n'
+            'SUMMARY:Exam day [CSE-110]\r\n'
+            'DTSTART;VALUE=DATE:20241005\r\n'
+            'END:VEVENT\r\n'
+            'END:VCALENDAR\r\n'
+        ).encode())
+        with patch('utils.http_client.get', return_value=feed_response(feed)):
+            result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        self.assertEqual(result.events, 4)
+
+        exam = Event.query.filter_by(title='Exam day [CSE-110]').one()
+        self.assertEqual(exam.date, datetime(2024, 10, 5))
+
+        # A re-import matches the all-day row instead of adding it again
+        self.user.canvas_content_hash = None
+        with patch('utils.http_client.get', return_value=feed_response(feed)):
+            result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        self.assertEqual((result.events, result.updated), (0, 0))
+        self.assertEqual(Event.query.count(), 4)
+
+    def test_recurring_series_with_utc_until(self):
+        feed = (
+            'BEGIN:VCALENDAR\r\n'
+            'BEGIN:VEVENT\r\n'
+            'UID:event-lecture\r\n'
+            'SUMMARY:Lecture [CSE-110]\r\n'
+            'DTSTART;TZID=America/Phoenix:20240902T100000\r\n'
+            'RRULE:FREQ=WEEKLY;UNTIL=20241001T000000Z\r\n'
+            'END:VEVENT\r\n'
+            'END:VCALENDAR\r\n'
+        ).encode()
+        with patch('utils.http_client.get', return_value=feed_response(feed)):
+            import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+
+        lecture = Event.query.one()
+        # Stored next to the naive DTSTART as Phoenix wall-clock time
+        self.assertEqual(lecture.rrule, 'FREQ=WEEKLY;UNTIL=20240930T170000')
+        self.assertEqual(lecture.recurrence_end, datetime(2024, 9, 30, 17, 0))
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user.id
+        response = client.get('/calendar/events', query_string={'start': '2024-09-01', 'end': '2024-10-31'})
+        self.assertEqual([e['start'][:10] for e in response.get_json()],
+                         ['2024-09-02', '2024-09-09', '2024-09-16', '2024-09-23', '2024-09-30'])
+
+    def test_sub_daily_series_imported_once(self):
+        feed = (
+            'BEGIN:VCALENDAR\r\n'
+            'BEGIN:VEVENT\r\n'
+            'UID:event-ping\r\n'
+            'SUMMARY:Ping [CSE-110]\r\n'
+            'DTSTART:20240902T100000\r\n'
+            'RRULE:FREQ=SECONDLY;COUNT=3000000\r\n'
+            'END:VEVENT\r\n'
+            'END:VCALENDAR\r\n'
+        ).encode()
+        with patch('utils.http_client.get', return_value=feed_response(feed)):
+            result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        self.assertEqual(result.events, 1)
+        ping = Event.query.one()
+        self.assertIsNone(ping.rrule)
+        self.assertEqual(ping.date, datetime(2024, 9, 2, 10, 0))
+
+    @patch('utils.http_client.get', return_value=feed_response())
+    def test_reimport_adds_nothing(self, mock_get):
+        import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        self.user.canvas_content_hash = None
+        result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+
+        self.assertEqual(result.events, 0)
+        self.assertEqual(Event.query.count(), 3)
+        self.assertEqual(Class.query.count(), 2)
+
+    def test_sync_events_uses_constant_queries(self):
+        base = datetime(2024, 9, 1, 23, 59)
+        events = [{'title': f'Quiz {i}', 'date': base + timedelta(days=i), 'description': '',
+                   'rrule': None, 'exdates': [], 'course': None, 'uid': f'quiz-{i}'}
+                  for i in range(200)]
+        # Imported before UIDs were stored
+        db.session.add(Event(title='Quiz 0', date=base, user_id=self.user.id))
+        db.session.commit()
+        db.session.refresh(self.user)
+
+        statements = []
+        def count(conn, cursor, statement, *args):
+            statements.append(statement.split()[0])
+        sa_event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            sync = sync_canvas_events(events + events[:5], self.user)
+        finally:
+            sa_event.remove(db.engine, 'before_cursor_execute', count)
+
+        self.assertEqual((sync.added, sync.updated, sync.deleted), (199, 1, 0))
+        # Stored UIDs, legacy keys, one INSERT, one UPDATE and the version bump
+        self.assertEqual(statements, ['SELECT', 'SELECT', 'INSERT', 'UPDATE', 'UPDATE'])
+        db.session.commit()
+        self.assertEqual(Event.query.filter_by(user_id=self.user.id).count(), 200)
+        self.assertEqual(Event.query.filter(Event.canvas_uid.is_(None)).count(), 0)
+
+    @patch('utils.http_client.get')
+    def test_reimport_applies_delta(self, mock_get):
+        mock_get.return_value = feed_response()
+        import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        manual = Event(title='Dentist', date=datetime(2024, 10, 2, 9, 0), user_id=self.user.id)
+        db.session.add(manual)
+        db.session.commit()
+        version = self.user.calendar_version
+
+        changed = (FEED.replace(b'DTSTART:20241001T235900', b'DTSTART:20241002T235900')
+                       .replace(b'UID:event-assignment-2', b'UID:event-assignment-4'))
+        mock_get.return_value = feed_response(changed)
+        result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+
+        self.assertEqual((result.events, result.updated, result.deleted), (1, 1, 1))
+        self.assertGreater(self.user.calendar_version, version)
+        self.assertEqual(
+            sorted(e.canvas_uid for e in Event.query.filter(Event.canvas_uid.isnot(None))),
+            ['event-assignment-1', 'event-assignment-3', 'event-assignment-4'])
+        homework = Event.query.filter_by(canvas_uid='event-assignment-1').one()
+        self.assertEqual(homework.date, datetime(2024, 10, 2, 23, 59))
+        self.assertIsNotNone(db.session.get(Event, manual.id))
+
+    @patch('utils.http_client.get')
+    def test_empty_feed_keeps_events(self, mock_get):
+        mock_get.return_value = feed_response()
+        import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        mock_get.return_value = feed_response(b'BEGIN:VCALENDAR\r\nEND:VCALENDAR\r\n')
+        result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+
+        self.assertEqual(result.deleted, 0)
+        self.assertEqual(Event.query.count(), 3)
+
+    def test_enroll_does_not_load_rosters(self):
+        cse = Class(name='CSE-110')
+        cse.students = [User(username=f's{i}', email=f's{i}@example.com', password='x')
+                        for i in range(50)]
+        db.session.add(cse)
+        db.session.commit()
+        db.session.refresh(self.user)
+
+        statements = []
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+        sa_event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            first = enroll_canvas_courses({'CSE-110', 'MAT-265'}, self.user)
+            second = enroll_canvas_courses({'CSE-110', 'MAT-265'}, self.user)
+        finally:
+            sa_event.remove(db.engine, 'before_cursor_execute', count)
+        db.session.commit()
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['CSE-110'], cse.id)
+        self.assertFalse([s for s in statements if 'FROM user' in s])
+        self.assertEqual(len(cse.students), 51)
+        self.assertEqual(sorted(c.name for c in self.user.classes), ['CSE-110', 'MAT-265'])
+
+    @patch('utils.http_client.get')
+    def test_reimport_revalidates_with_etag(self, mock_get):
+        mock_get.return_value = feed_response(headers={'ETag': '"v1"'})
+        import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        self.assertEqual(self.user.canvas_etag, '"v1"')
+
+        mock_get.return_value = feed_response(content=b'', status_code=304)
+        result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        self.assertTrue(result.unchanged)
+        self.assertEqual(mock_get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+
+    @patch('utils.iter_canvas_events', wraps=iter_canvas_events)
+    @patch('utils.http_client.get', return_value=feed_response())
+    def test_identical_body_skips_parse(self, mock_get, mock_parse):
+        import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+        result = import_canvas_feed('https://canvas.example.edu/feed.ics', self.user)
+
+        self.assertTrue(result.unchanged)
+        self.assertEqual(mock_parse.call_count, 1)
+
+    @patch('routes.socketio.emit')
+    @patch('utils.http_client.get', return_value=feed_response())
+    def test_import_route_runs_in_background(self, mock_get, mock_emit):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user.id
+
+        response = client.post('/calendar/import_canvas',
+                               json={'canvas_url': 'https://canvas.example.edu/feed.ics'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        job_queue.wait(job_id, timeout=10)
+
+        status = client.get(f'/calendar/import_status/{job_id}').get_json()
+        self.assertEqual(status['status'], 'finished')
+        self.assertEqual((status['result']['courses'], status['result']['events']), (2, 3))
+        mock_emit.assert_called_once()
+        self.assertEqual(mock_emit.call_args.args[:2], ('job_finished', status))
+        self.assertEqual(mock_emit.call_args.kwargs['room'], f'user_{self.user.id}')
+
+        other = User(username='other', email='other@example.com', password='x')
+        db.session.add(other)
+        db.session.commit()
+        with client.session_transaction() as session:
+            session['user_id'] = other.id
+        self.assertEqual(client.get(f'/calendar/import_status/{job_id}').status_code, 404)
+
+    @patch('routes.socketio.emit')
+    def test_saving_url_imports_in_background(self, mock_emit):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user.id
+
+        release = threading.Event()
+        def slow_get(*args, **kwargs):
+            release.wait(10)
+            return feed_response()
+
+        with patch('utils.http_client.get', side_effect=slow_get) as mock_get:
+            response = client.post('/calendar/save_canvas_url',
+                                   json={'canvas_url': 'https://canvas.example.edu/feed.ics'})
+            # Answered while the download is still blocked
+            self.assertTrue(response.get_json()['success'])
+            self.assertEqual(Event.query.count(), 0)
+
+            release.set()
+            job_queue.wait(response.get_json()['job_id'], timeout=10)
+            self.assertEqual(mock_get.call_count, 1)
+
+        db.session.expire_all()
+        self.assertEqual(Event.query.count(), 3)
+
+    def test_changing_url_resets_validators(self):
+        self.user.canvas_ical_url = 'https://canvas.example.edu/a.ics'
+        self.user.canvas_etag = '"v1"'
+        self.user.canvas_content_hash = 'abc'
+        self.user.set_canvas_url('https://canvas.example.edu/b.ics')
+        self.assertIsNone(self.user.canvas_etag)
+        self.assertIsNone(self.user.canvas_content_hash)
+
+    @patch('utils.http_client.get', return_value=feed_response(status_code=404))
+    def test_failed_download(self, mock_get):
+        self.assertFalse(import_canvas_feed('https://canvas.example.edu/feed.ics', self.user))
+        self.assertEqual(Event.query.count(), 0)
+
+
+
+def scale(job, value, factor=2):
+    job.progress(1, 1)
+    return value * factor
+
+
+class LocalBrokerTestCases(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = JobQueue()
+        self.queue.app = app
+        self.queue.poll_interval = 0.05
+        self.queue.broker = LocalBroker(os.path.join(self.tmp.name, 'jobs.db'))
+
+    def tearDown(self):
+        self.queue.stop_workers()
+        self.tmp.cleanup()
+
+    def test_jobs_run_through_broker(self):
+        finished = []
+        self.queue.on_finish(finished.append)
+        job = self.queue.submit('scale', 7, scale, 21)
+        failing = self.queue.submit('scale', 7, scale, None)
+        self.assertEqual(self.queue.get(job.id).status, 'queued')
+
+        # Any process sharing the file can work the queue
+        self.queue.start_workers(2)
+        job = self.queue.wait(job.id, timeout=10)
+        failing = self.queue.wait(failing.id, timeout=10)
+
+        self.assertEqual((job.status, job.result, job.done, job.total), ('finished', 42, 1, 1))
+        self.assertEqual(failing.status, 'failed')
+        self.assertEqual(sorted(j.id for j in finished), sorted([job.id, failing.id]))
+        self.assertIsNone(self.queue.broker.claim())
+
+
+class HTTPClientTestCases(unittest.TestCase):
+    def setUp(self):
+        self.client = HTTPClient(connect_timeout=1, read_timeout=0.5, retries=2, backoff=0,
+                                 max_response_size=len(FEED))
+
+    def test_reuses_connections_and_records_metrics(self):
+        with FeedServer({'/feed.ics': FEED}) as server:
+            first = self.client.get(server.url('/feed.ics'))
+            second = self.client.get(server.url('/feed.ics'), headers={'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual((first.status_code, first.content), (200, FEED))
+        self.assertEqual(second.status_code, 304)
+        stats = self.client.stats()
+        self.assertEqual((stats['requests'], stats['failures'], stats['bytes']), (2, 0, len(FEED)))
+        self.assertEqual(stats['statuses'], {200: 1, 304: 1})
+
+    def test_retries_server_errors(self):
+        with FeedServer({'/feed.ics': FEED}) as server:
+            server.failures['/feed.ics'] = 2
+            response = self.client.get(server.url('/feed.ics'))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(server.requests, ['/feed.ics'] * 3)
+
+            server.failures['/feed.ics'] = 3
+            self.assertEqual(self.client.get(server.url('/feed.ics')).status_code, 503)
+
+    def test_rejects_oversized_and_slow_responses(self):
+        with FeedServer({'/big.ics': FEED + b' ', '/slow.ics': FEED}) as server:
+            server.delays['/slow.ics'] = 1
+            self.assertRaises(ResponseTooLarge, self.client.get, server.url('/big.ics'))
+            self.client.configure(1, 0.2, 0, 0, 10, len(FEED))
+            with self.assertRaises(requests.RequestException):
+                self.client.get(server.url('/slow.ics'))
+
+        stats = self.client.stats()
+        self.assertEqual((stats['failures'], stats['too_large']), (2, 1))
+
+
+class CanvasSyncTestCases(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_sync_deduplicates_urls_and_records_status(self):
+        with FeedServer({'/shared.ics': FEED}) as server:
+            shared = server.url('/shared.ics')
+            users = [
+                User(username='a', email='a@example.com', password='x', canvas_ical_url=shared),
+                User(username='b', email='b@example.com', password='x', canvas_ical_url=shared),
+                User(username='c', email='c@example.com', password='x',
+                     canvas_ical_url=server.url('/missing.ics')),
+                User(username='d', email='d@example.com', password='x'),
+            ]
+            db.session.add_all(users)
+            db.session.commit()
+
+            service = CanvasSyncService(max_concurrency=2)
+            summary = service.sync_all()
+            self.assertEqual(sorted(server.requests), ['/missing.ics', '/shared.ics'])
+            self.assertEqual(summary, {'users': 3, 'urls': 2, 'imported': 2,
+                                       'unchanged': 0, 'failed': 1})
+            self.assertEqual([u.canvas_sync_status for u in users], ['ok', 'ok', 'failed', None])
+            self.assertEqual(Event.query.filter_by(user_id=users[1].id).count(), 3)
+
+            summary = service.sync_all()
+            self.assertEqual(summary['unchanged'], 2)
+            self.assertEqual(users[0].canvas_sync_status, 'unchanged')
+            self.assertIsNotNone(users[0].canvas_synced_at)
+            self.assertEqual(Event.query.count(), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+# Run from the repository root:
+# python -m unittest discover -s tests -p "test_messages.py"
+
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+import socketio
+from sqlalchemy import event as sa_event
+from app import app
+from extensions import db
+from models import User, Message, Conversation
+from socket_queue import LocalPubSubManager
+
+
+class MessagingTestCases(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = app.test_client()
+
+        self.user = User(username='me', email='me@example.com', password='x')
+        db.session.add(self.user)
+        db.session.commit()
+        self.login(self.user)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, user):
+        with self.client.session_transaction() as session:
+            session['user_id'] = user.id
+
+    def add_friends(self, count):
+        start = self.user.friends.count()
+        friends = [User(username=f'friend{i:02d}', email=f'f{i}@example.com', password='x')
+                   for i in range(start, start + count)]
+        self.user.friends.extend(friends)
+        db.session.commit()
+        return friends
+
+    def send(self, sender, recipient, content):
+        self.login(sender)
+        response = self.client.post('/messages/send', json={'recipient_id': recipient.id, 'content': content})
+        self.assertTrue(response.get_json()['success'])
+
+    def count_selects(self, path):
+        statements = []
+        def count(conn, cursor, statement, *args):
+            if statement.startswith('SELECT'):
+                statements.append(statement)
+        sa_event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = self.client.get(path)
+        finally:
+            sa_event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_send_and_read_maintain_conversation(self):
+        friend, = self.add_friends(1)
+        self.send(friend, self.user, 'hello')
+        self.send(friend, self.user, 'are you there?')
+        self.send(self.user, friend, 'x' * 300)
+
+        conversation = Conversation.query.one()
+        self.assertEqual(conversation.unread_for(self.user.id), 2)
+        self.assertEqual(conversation.unread_for(friend.id), 1)
+        self.assertEqual(conversation.last_sender_id, self.user.id)
+        self.assertEqual(conversation.last_preview, 'x' * 200)
+        self.assertEqual(conversation.last_message_id, Message.query.order_by(Message.id.desc()).first().id)
+
+        self.login(self.user)
+        self.client.post(f'/messages/mark-read/{friend.id}')
+        db.session.expire_all()
+        self.assertEqual(conversation.unread_for(self.user.id), 0)
+        self.assertEqual(conversation.unread_for(friend.id), 1)
+        self.assertEqual(Message.query.filter_by(recipient_id=self.user.id, status='unread').count(), 0)
+
+    def test_inbox_lists_recent_conversations_first(self):
+        quiet, busy = self.add_friends(2)
+        self.send(busy, self.user, 'ping')
+
+        self.login(self.user)
+        html = self.client.get('/messages/').get_data(as_text=True)
+        self.assertLess(html.index('friend01'), html.index('friend00'))
+        self.assertIn('ping', html)
+        self.assertIn('No messages yet', html)
+
+    def test_inbox_query_count_is_independent_of_friends(self):
+        friends = self.add_friends(2)
+        for friend in friends:
+            self.send(friend, self.user, 'hi')
+        self.login(self.user)
+        few = self.count_selects('/messages/')
+
+        friends = self.add_friends(20)
+        for friend in friends:
+            self.send(friend, self.user, 'hi')
+        self.login(self.user)
+        self.assertEqual(self.count_selects('/messages/'), few)
+
+    def test_conversation_key_is_shared_and_indexed(self):
+        friend, = self.add_friends(1)
+        self.send(friend, self.user, 'first-message')
+        self.send(self.user, friend, 'second-message')
+        keys = {m.conversation_key for m in Message.query.all()}
+        self.assertEqual(keys, {Message.key_for(friend.id, self.user.id)})
+
+        history = Message.query.filter(
+            Message.conversation_key == Message.key_for(self.user.id, friend.id)
+        ).order_by(Message.timestamp)
+        plan = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + str(history.statement.compile(
+            compile_kwargs={'literal_binds': True})))).all()
+        self.assertIn('ix_message_conversation_key_timestamp', str(plan))
+
+        self.login(self.user)
+        html = self.client.get(f'/messages/{friend.id}').get_data(as_text=True)
+        chat = html[html.index('class="message-list'):]
+        self.assertLess(chat.index('first-message'), chat.index('second-message'))
+
+    def test_history_pages_with_keyset_cursor(self):
+        friend, = self.add_friends(1)
+        base = datetime(2024, 3, 1, 12, 0)
+        for i in range(120):
+            sender, recipient = (self.user, friend) if i % 2 else (friend, self.user)
+            # Pairs of messages share a timestamp to exercise the id tie-breaker
+            db.session.add(Message(sender_id=sender.id, recipient_id=recipient.id, content=f'm{i}',
+                                   timestamp=base + timedelta(seconds=i // 2)))
+        db.session.commit()
+
+        html = self.client.get(f'/messages/{friend.id}').get_data(as_text=True)
+        chat = html[html.index('class="message-list'):]
+        self.assertEqual(chat.count('class="message-bubble'), 50)
+        self.assertIn('m119', chat)
+        self.assertNotIn('>m69<', chat)
+
+        seen = []
+        url = f'/messages/api/history/{friend.id}'
+        data = self.client.get(url, query_string={'limit': 50}).get_json()
+        while True:
+            seen = [m['content'] for m in data['messages']] + seen
+            if not data['has_more']:
+                break
+            data = self.client.get(url, query_string={'before': data['before']}).get_json()
+        self.assertEqual(seen, [f'm{i}' for i in range(120)])
+
+        self.assertEqual(self.client.get(url, query_string={'before': 'not-a-cursor'}).status_code, 400)
+
+    def test_unread_counter_is_maintained_and_pushed(self):
+        alice, bob = self.add_friends(2)
+        with patch('routes.socketio.emit') as emit:
+            self.send(alice, self.user, 'one')
+            self.send(alice, self.user, 'two')
+            self.send(bob, self.user, 'three')
+            self.send(self.user, alice, 'reply')
+        pushed = [c for c in emit.call_args_list if c.args[0] == 'unread_count']
+        self.assertEqual(pushed[-2].args[1], {'count': 3})
+        self.assertEqual(pushed[-2].kwargs['room'], f'user_{self.user.id}')
+        self.assertEqual(pushed[-1].kwargs['room'], f'user_{alice.id}')
+
+        db.session.expire_all()
+        self.assertEqual(self.user.unread_messages, 3)
+        self.assertEqual(alice.unread_messages, 1)
+
+        self.login(self.user)
+        with patch('routes.socketio.emit') as emit:
+            self.client.post(f'/messages/mark-read/{alice.id}')
+            # Nothing left unread from alice, so nothing to push
+            self.client.post(f'/messages/mark-read/{alice.id}')
+        emit.assert_called_once_with('unread_count', {'count': 1}, room=f'user_{self.user.id}')
+
+        response = self.client.get('/messages/api/messages/unread-count')
+        self.assertEqual(response.get_json(), {'count': 1})
+        with patch('routes.socketio.emit'):
+            self.client.get(f'/messages/{bob.id}')
+        self.assertEqual(self.client.get('/messages/unread_count').get_json(), {'count': 0})
+
+    def test_connection_requests_count_as_unread(self):
+        peer, = self.add_friends(1)
+        with patch('routes.socketio.emit') as emit:
+            self.client.post(f'/messages/connect/{peer.id}')
+        emit.assert_called_once_with('unread_count', {'count': 1}, room=f'user_{peer.id}')
+
+        self.send(self.user, peer, 'hi')
+        self.login(peer)
+        self.assertEqual(self.client.get('/messages/unread_count').get_json(), {'count': 2})
+        # Requests stay out of the chat summary
+        self.assertEqual(Conversation.query.one().unread_for(peer.id), 1)
+
+        with patch('routes.socketio.emit') as emit:
+            self.client.post(f'/messages/mark-read/{self.user.id}')
+        emit.assert_called_once_with('unread_count', {'count': 0}, room=f'user_{peer.id}')
+        self.assertEqual(Message.query.filter_by(status='unread').count(), 0)
+
+    def test_accepting_request_clears_it_from_unread(self):
+        peer, = self.add_friends(1)
+        with patch('routes.socketio.emit'):
+            self.client.post(f'/messages/connect/{peer.id}')
+        request = Message.query.filter_by(message_type='connection_request').one()
+
+        # Only the recipient can accept
+        self.assertEqual(self.client.post(f'/messages/accept/{request.id}').status_code, 404)
+
+        self.login(peer)
+        with patch('routes.socketio.emit') as emit:
+            self.assertTrue(self.client.post(f'/messages/accept/{request.id}').get_json()['success'])
+            self.client.post(f'/messages/accept/{request.id}')
+        emit.assert_called_once_with('unread_count', {'count': 0}, room=f'user_{peer.id}')
+        self.assertEqual(self.client.get('/messages/unread_count').get_json(), {'count': 0})
+        self.assertEqual(db.session.get(Message, request.id).status, 'accepted')
+
+
+class SocketQueueTestCases(unittest.TestCase):
+    """Servers sharing a LocalPubSubManager file, as worker processes would."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = f'{self.tmpdir}/socketio.db'
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+        time.sleep(0.05)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def worker(self, room):
+        # A server with one client connected in `room`; packets to it are captured
+        manager = LocalPubSubManager(self.path, poll_interval=0.01)
+        self.managers.append(manager)
+        server = socketio.Server(client_manager=manager, async_mode='threading')
+        server._send_eio_packet = Mock()
+        manager.initialize()  # normally done on the first connection
+        sid = manager.connect('eio-1', '/')
+        manager.enter_room(sid, '/', room)
+        return server
+
+    def delivered(self, server, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not server._send_eio_packet.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Encoded Socket.IO EVENT packets: '2' followed by the JSON [event, data]
+        return [json.loads(call.args[1].data[1:]) for call in server._send_eio_packet.call_args_list]
+
+    def test_room_emit_reaches_client_on_other_worker(self):
+        alice = self.worker('user_1')
+        bob = self.worker('user_2')
+        time.sleep(0.05)
+
+        bob.emit('unread_count', {'count': 4}, room='user_1')
+        self.assertEqual(self.delivered(alice), [['unread_count', {'count': 4}]])
+        self.assertEqual(self.delivered(bob, timeout=0.2), [])
+
+    def test_write_only_emitter_does_not_replay_history(self):
+        emitter = LocalPubSubManager(self.path, write_only=True)
+        emitter.emit('job_finished', {'id': 'old'}, room='user_1')
+
+        worker = self.worker('user_1')
+        time.sleep(0.05)
+        emitter.emit('job_finished', {'id': 'new'}, room='user_1')
+        self.assertEqual(self.delivered(worker), [['job_finished', {'id': 'new'}]])
+
+if __name__ == '__main__':
+    unittest.main()
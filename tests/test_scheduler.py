@@ -0,0 +1,217 @@
+# Run from the repository root:
+# python -m unittest discover -s tests -p "test_scheduler.py"
+
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import unittest
+from collections import namedtuple
+from datetime import datetime, timedelta
+from app import app
+from extensions import db
+from models import User, Class, Event
+from scheduler import BusyIndex, plan_study_sessions
+from availability import common_free_bitmap, free_ranges
+from jobs import job_queue
+
+Assignment = namedtuple('Assignment', ['title', 'date', 'class_id'])
+
+
+class BusyIndexTestCases(unittest.TestCase):
+    def test_merges_and_finds_gaps(self):
+        day = datetime(2024, 10, 1)
+        busy = BusyIndex([
+            (day.replace(hour=9), day.replace(hour=10)),
+            (day.replace(hour=9, minute=30), day.replace(hour=11)),
+            (day.replace(hour=12), day.replace(hour=13)),
+        ])
+        self.assertEqual(len(busy), 2)
+
+        hour = timedelta(hours=1)
+        self.assertEqual(busy.next_free(day.replace(hour=9), hour, day.replace(hour=21)),
+                         day.replace(hour=11))
+        self.assertEqual(busy.next_free(day.replace(hour=11, minute=30), hour, day.replace(hour=21)),
+                         day.replace(hour=13))
+        self.assertIsNone(busy.next_free(day.replace(hour=9), hour, day.replace(hour=11, minute=30)))
+
+
+class PlanStudySessionsTestCases(unittest.TestCase):
+    now = datetime(2024, 10, 1, 8)
+
+    def test_sessions_do_not_stack_or_overlap_busy_time(self):
+        due = datetime(2024, 10, 10, 23, 59)
+        assignments = [Assignment(f'HW {i}', due, 1) for i in range(3)]
+        busy = BusyIndex([(datetime(2024, 10, 5, 9), datetime(2024, 10, 5, 10))])
+
+        planned = plan_study_sessions(assignments, busy, self.now)
+        self.assertEqual(len(planned), 9)
+
+        starts = sorted(s.start for s in planned)
+        self.assertEqual(len(set(starts)), 9)
+        for earlier, later in zip(starts, starts[1:]):
+            self.assertGreaterEqual(later - earlier, timedelta(hours=1))
+        self.assertNotIn(datetime(2024, 10, 5, 9), starts)
+
+    def test_daily_capacity_spreads_sessions(self):
+        due = datetime(2024, 10, 10, 23, 59)
+        assignments = [Assignment(f'HW {i}', due, 1) for i in range(4)]
+
+        planned = plan_study_sessions(assignments, BusyIndex(), self.now,
+                                      daily_capacity=timedelta(hours=2))
+        per_day = {}
+        for s in planned:
+            per_day[s.start.date()] = per_day.get(s.start.date(), 0) + 1
+        self.assertTrue(all(count <= 2 for count in per_day.values()))
+        self.assertEqual(len(planned), 12)
+
+    def test_sessions_end_before_due_time_and_after_now(self):
+        due = datetime(2024, 10, 2, 11, 0)
+        planned = plan_study_sessions([Assignment('Quiz', due, 1)], BusyIndex(), self.now)
+
+        self.assertTrue(planned)
+        for s in planned:
+            self.assertLessEqual(s.end, due)
+            self.assertGreaterEqual(s.start, self.now)
+
+
+class AvailabilityTestCases(unittest.TestCase):
+    def test_common_free_ranges(self):
+        start, end = datetime(2024, 10, 1), datetime(2024, 10, 2)
+        free = common_free_bitmap({
+            1: [(datetime(2024, 10, 1, 10), datetime(2024, 10, 1, 11, 10))],
+            2: [(datetime(2024, 10, 1, 15), datetime(2024, 10, 1, 16))],
+        }, start, end)
+
+        self.assertEqual(free_ranges(free, start, min_slots=4), [
+            (datetime(2024, 10, 1, 9), datetime(2024, 10, 1, 10)),
+            (datetime(2024, 10, 1, 11, 15), datetime(2024, 10, 1, 15)),
+            (datetime(2024, 10, 1, 16), datetime(2024, 10, 1, 21)),
+        ])
+
+
+class GenerateScheduleRouteTestCases(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = app.test_client()
+
+        self.user = User(username='planner', email='plan@example.com', password='x')
+        self.class_ = Class(name='MAT-265')
+        self.user.classes.append(self.class_)
+        db.session.add_all([self.user, self.class_])
+        db.session.commit()
+
+        with self.client.session_transaction() as session:
+            session['user_id'] = self.user.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_smart_schedule_replaces_previous_sessions(self):
+        due = (datetime.now() + timedelta(days=10)).replace(hour=23, minute=0, second=0, microsecond=0)
+        db.session.add(Event(title='Exam', date=due, user_id=self.user.id,
+                             class_id=self.class_.id, event_type='assignment'))
+        db.session.commit()
+
+        for _ in range(2):
+            response = self.client.post('/calendar/generate_smart_schedule', json={'daily_hours': 2})
+            self.assertTrue(response.get_json()['success'])
+
+        sessions = Event.query.filter_by(event_type='study_session').all()
+        self.assertEqual(len(sessions), 3)
+        self.assertTrue(all(s.class_id == self.class_.id for s in sessions))
+        self.assertEqual(len({s.date for s in sessions}), 3)
+
+    def test_daily_cap_counts_sessions_for_other_classes(self):
+        other = Class(name='PHY-121')
+        self.user.classes.append(other)
+        db.session.commit()
+        due = (datetime.now() + timedelta(days=10)).replace(hour=23, minute=0, second=0, microsecond=0)
+        for class_ in (self.class_, other):
+            db.session.add(Event(title=f'{class_.name} exam', date=due, user_id=self.user.id,
+                                 class_id=class_.id, event_type='assignment'))
+        db.session.commit()
+
+        window = {'start_date': datetime.now().strftime('%Y-%m-%d'),
+                  'end_date': due.strftime('%Y-%m-%d'), 'daily_hours': 1}
+        for class_ in (self.class_, other):
+            response = self.client.post('/calendar/generate_schedule',
+                                        json=dict(window, class_id=class_.id))
+            self.assertTrue(response.get_json()['success'])
+
+        sessions = Event.query.filter_by(event_type='study_session').all()
+        self.assertEqual(len(sessions), 6)
+        self.assertEqual(len({s.date.date() for s in sessions}), 6)
+
+    def test_common_free_time_for_class(self):
+        classmate = User(username='mate', email='mate@example.com', password='x')
+        classmate.classes.append(self.class_)
+        db.session.add(classmate)
+        db.session.commit()
+        db.session.add(Event(title='Work', date=datetime(2024, 10, 1, 9), user_id=classmate.id))
+        db.session.add(Event(title='Lab', date=datetime(2024, 10, 1, 12), user_id=self.user.id))
+        db.session.commit()
+
+        response = self.client.get('/calendar/common_free_time', query_string={
+            'class_id': self.class_.id, 'start': '2024-10-01', 'end': '2024-10-02',
+            'min_minutes': 120
+        })
+        data = response.get_json()
+        self.assertEqual(data['members'], 2)
+        self.assertEqual(data['slots'], [
+            {'start': '2024-10-01T10:00:00', 'end': '2024-10-01T12:00:00'},
+            {'start': '2024-10-01T13:00:00', 'end': '2024-10-01T21:00:00'},
+        ])
+
+    def test_common_free_time_requires_membership(self):
+        other = Class(name='PHY-121')
+        db.session.add(other)
+        db.session.commit()
+        response = self.client.get('/calendar/common_free_time', query_string={
+            'class_id': other.id, 'start': '2024-10-01', 'end': '2024-10-02'
+        })
+        self.assertEqual(response.status_code, 403)
+
+    def test_class_plans_generated_in_background(self):
+        self.class_.created_by = self.user.id
+        classmate = User(username='mate', email='mate@example.com', password='x')
+        classmate.classes.append(self.class_)
+        db.session.add(classmate)
+        db.session.commit()
+
+        due = (datetime.now() + timedelta(days=10)).replace(hour=23, minute=0, second=0, microsecond=0)
+        for student in (self.user, classmate):
+            db.session.add(Event(title='Project', date=due, user_id=student.id,
+                                 class_id=self.class_.id, event_type='assignment'))
+        db.session.commit()
+
+        response = self.client.post(f'/calendar/classes/{self.class_.id}/generate_plans')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        job_queue.wait(job_id, timeout=10)
+
+        status = self.client.get(f'/calendar/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'finished')
+        self.assertEqual((status['done'], status['total']), (2, 2))
+        self.assertEqual(status['result'], {'students': 2, 'assignments': 1, 'sessions': 6})
+
+        db.session.expire_all()
+        for student in (self.user, classmate):
+            self.assertEqual(Event.query.filter_by(user_id=student.id,
+                                                   event_type='study_session').count(), 3)
+
+    def test_class_plans_require_creator(self):
+        response = self.client.post(f'/calendar/classes/{self.class_.id}/generate_plans')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_daily_hours(self):
+        response = self.client.post('/calendar/generate_smart_schedule', json={'daily_hours': 'lots'})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,22 @@
-from models import User, Class, Event, Message, Notification, CourseResource, StudyGroup, Resource, PeerReview, StudyMeeting
+from models import user_classes, User, Class, Event, Message, Conversation, Notification, CourseResource, StudyGroup, Resource, PeerReview, StudyMeeting
 from flask import session, redirect, url_for
 from extensions import db
+from cache import feed_cache
+from http_client import http_client
+from recurrence import series_end, format_exdates, naive_until
+from ical_parser import iter_vevents
 from datetime import datetime, timedelta
 import requests
+import hashlib
 from icalendar import Calendar
 import logging
 import re
 from functools import wraps
+from itertools import islice
+from collections import namedtuple
+from sqlalchemy import and_, or_, insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask import flash, current_app
 import random
 import pytz
@@ -27,7 +37,91 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Events are rendered as one-hour blocks on the calendar
+EVENT_DURATION = timedelta(hours=1)
+
+def event_window_filter(window_start, window_end):
+    """
+    SQL criterion for events visible in [window_start, window_end): one-off
+    events overlapping it, and recurring series that start before its end
+    and have not finished before its start.
+    """
+    return or_(
+        and_(
+            Event.rrule.is_(None),
+            Event.date > window_start - EVENT_DURATION,
+            Event.date < window_end
+        ),
+        and_(
+            Event.rrule.isnot(None),
+            Event.date < window_end,
+            or_(Event.recurrence_end.is_(None),
+                Event.recurrence_end > window_start - EVENT_DURATION)
+        )
+    )
+
+def bump_calendar_version(*user_ids):
+    """
+    Increment the calendar version of the given users. Runs as a single
+    UPDATE in the caller's transaction; the caller commits.
+    """
+    if not user_ids:
+        return
+    User.query.filter(User.id.in_(user_ids)).update(
+        {User.calendar_version: User.calendar_version + 1,
+         User.calendar_updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    for user_id in user_ids:
+        feed_cache.invalidate_user(user_id)
+
+def bump_class_calendar_versions(class_id):
+    """Bump the version of every user with events in the given class."""
+    owners = db.session.query(Event.user_id).filter(Event.class_id == class_id).distinct()
+    bump_calendar_version(*[user_id for (user_id,) in owners])
+
+def calendar_etag(user, *parts):
+    """Strong ETag for a calendar response, derived from the user's version."""
+    return '-'.join(str(p) for p in (user.id, user.calendar_version) + parts)
+
+def parse_date_window(args):
+    """
+    Read the FullCalendar `start`/`end` query params as naive datetimes.
+    Returns (None, None) when no window was requested.
+    """
+    start = args.get('start')
+    end = args.get('end')
+    if not start or not end:
+        return None, None
+
+    # Events are stored as naive wall-clock times, so drop any UTC offset
+    start = datetime.fromisoformat(start.replace('Z', '+00:00')).replace(tzinfo=None)
+    end = datetime.fromisoformat(end.replace('Z', '+00:00')).replace(tzinfo=None)
+    if end <= start:
+        raise ValueError('Window end must be after start')
+    return start, end
+
+def ical_exdates(component):
+    exdate = component.get('exdate')
+    if not exdate:
+        return []
+    if not isinstance(exdate, list):
+        exdate = [exdate]
+    return [d.dt for entry in exdate for d in entry.dts]
+
+# Summary of one Canvas import
+ImportResult = namedtuple('ImportResult', ['courses', 'events', 'unchanged', 'updated', 'deleted'],
+                          defaults=(False, 0, 0))
+# Body and validators from one Canvas feed download
+FeedDownload = namedtuple('FeedDownload', ['content', 'etag', 'last_modified'])
+# Events parsed, enrolled and inserted per round trip while streaming a feed
+IMPORT_CHUNK = 500
+
 def parse_ical_data(ical_data):
+    """
+    Parse an iCal feed once into VEVENT dicts, including the course code
+    each event belongs to (or None).
+    """
     cal = Calendar.from_ical(ical_data)
     events = []
 
@@ -36,44 +130,292 @@ def parse_ical_data(ical_data):
             event_title = str(component.get('summary', ''))
             event_date = component.get('dtstart').dt  # This returns a datetime object
             event_description = str(component.get('description', ''))
+            rrule = component.get('rrule')
 
             # Append parsed event to list of events
             events.append({
                 'title': event_title,
                 'date': event_date,
-                'description': event_description
+                'description': event_description,
+                'rrule': rrule.to_ical().decode() if rrule else None,
+                'exdates': ical_exdates(component),
+                'course': course_name_for(event_title or 'No Title', event_description)
             })
 
     return events
 
+def iter_canvas_events(ical_data):
+    """
+    Streaming counterpart of parse_ical_data: yields the same VEVENT dicts
+    (plus 'uid') one at a time without building the calendar tree.
+    """
+    for event in iter_vevents(ical_data):
+        event['course'] = course_name_for(event['title'] or 'No Title', event['description'])
+        yield event
+
+def course_name_for(summary, description):
+    # Check description first (usually more reliable)
+    if 'Course:' in description:
+        course_section = description.split('Course:')[1].split('\n')[0].strip()
+        course_name = extract_course_name(course_section)
+        if course_name:
+            return course_name
+
+    # If not found in description, try summary
+    match = re.search(r'\[(.*?)\]', summary)
+    if match:
+        return match.group(1).strip() or None
+    return None
+
+def download_canvas_feed(ical_url, etag=None, last_modified=None):
+    """
+    Download a Canvas iCal feed, revalidating with the given validators.
+    Returns a FeedDownload (content is None when the server answered 304),
+    or None on failure.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    try:
+        response = http_client.get(ical_url, headers=headers)
+    except requests.RequestException as e:
+        logging.error(f"Canvas download failed: {str(e)}")
+        return None
+    if response.status_code == 304:
+        return FeedDownload(None, etag, last_modified)
+    if response.status_code != 200:
+        logging.error(f"Canvas URL returned {response.status_code}")
+        return None
+    return FeedDownload(
+        response.content,
+        response.headers.get('ETag'),
+        response.headers.get('Last-Modified')
+    )
+
+def import_canvas_feed(ical_url, user):
+    """
+    Download and parse the feed once, then enroll the user in its courses
+    and add its events in a single transaction. Skips parsing entirely when
+    the feed is unchanged since the last import. Returns an ImportResult,
+    or False if nothing could be imported.
+    """
+    if not ical_url:
+        return False
+
+    try:
+        logging.info(f"Importing Canvas calendar for user {user.id}")
+        download = download_canvas_feed(ical_url, user.canvas_etag, user.canvas_last_modified)
+        if download is None:
+            return False
+
+        result = apply_canvas_download(user, download)
+        db.session.commit()
+        return result
+
+    except Exception as e:
+        logging.error(f"Canvas import failed: {str(e)}", exc_info=True)
+        db.session.rollback()
+        return False
+
+def run_canvas_import(job, user_id, ical_url):
+    """Background job wrapper around import_canvas_feed; returns a JSON-able summary."""
+    user = db.session.get(User, user_id)
+    result = import_canvas_feed(ical_url, user) if user else False
+    if not result:
+        raise RuntimeError('Failed to import Canvas data')
+    return {
+        'message': 'Canvas data is already up to date' if result.unchanged else 'Canvas data imported successfully',
+        'courses': result.courses,
+        'events': result.events,
+        'updated': result.updated,
+        'deleted': result.deleted
+    }
+
+def apply_canvas_download(user, download, events=None):
+    """
+    Apply a downloaded feed to the user's classes and events without
+    committing. `events` may carry an already parsed copy of the same body.
+    """
+    user.canvas_synced_at = datetime.utcnow()
+    if download.content is None:
+        logging.info(f"Canvas feed for user {user.id} not modified")
+        user.canvas_sync_status = 'unchanged'
+        return ImportResult(courses=0, events=0, unchanged=True)
+
+    content_hash = hashlib.sha256(download.content).hexdigest()
+    user.canvas_etag = download.etag
+    user.canvas_last_modified = download.last_modified
+    if content_hash == user.canvas_content_hash:
+        # Server does not support validators but the body is identical
+        user.canvas_sync_status = 'unchanged'
+        return ImportResult(courses=0, events=0, unchanged=True)
+
+    if events is None:
+        events = iter_canvas_events(download.content)
+    class_ids = {}
+    sync = CanvasEventSync(user)
+    events = iter(events)
+    while True:
+        chunk = list(islice(events, IMPORT_CHUNK))
+        if not chunk:
+            break
+        course_names = {e['course'] for e in chunk if e['course']} - class_ids.keys()
+        class_ids.update(enroll_canvas_courses(course_names, user))
+        sync.apply(chunk, class_ids)
+    sync.finish()
+
+    if not class_ids:
+        logging.warning("No valid courses found in calendar")
+    user.canvas_content_hash = content_hash
+    user.canvas_sync_status = 'ok'
+    return ImportResult(courses=len(class_ids), events=sync.added,
+                        updated=sync.updated, deleted=sync.deleted)
+
 def fetch_canvas_events(canvas_url, user):
     try:
-        response = requests.get(canvas_url)
-        if response.status_code == 200:
-            events = parse_ical_data(response.content)
+        download = download_canvas_feed(canvas_url)
+        if download is not None:
+            events = list(iter_canvas_events(download.content))
             process_canvas_events(events, user)
             return True
     except Exception as e:
         logging.error(f"Error fetching Canvas events: {str(e)}")
     return False
 
+def canvas_event_key(title, date):
+    # Dates are stored naive, so compare on wall-clock time; all-day
+    # (VALUE=DATE) events become midnight so they sort with timed ones
+    if not isinstance(date, datetime):
+        date = datetime.combine(date, datetime.min.time())
+    elif date.tzinfo is not None:
+        date = date.replace(tzinfo=None)
+    return title, date
+
+def canvas_event_row(event_data, user, class_ids):
+    """Event columns for a parsed VEVENT, including its UID and content hash."""
+    title, date = canvas_event_key(event_data['title'], event_data['date'])
+    row = {
+        'title': title,
+        'description': event_data.get('description', ''),
+        'date': date,
+        'user_id': user.id,
+        'class_id': class_ids.get(event_data.get('course')),
+        'rrule': None,
+        'exdates': None,
+        'recurrence_end': None
+    }
+    if event_data.get('rrule'):
+        # Store the series once instead of one row per occurrence
+        # UNTIL follows DTSTART onto naive wall-clock time
+        rule = naive_until(event_data['rrule'], event_data['date'])
+        try:
+            row['recurrence_end'] = series_end(rule, date)
+            row['rrule'] = rule
+            row['exdates'] = format_exdates(event_data.get('exdates', []))
+        except ValueError as e:
+            # e.g. an hourly rule; keep the first occurrence rather than fail the import
+            logging.warning(f"Importing {title!r} without its recurrence {rule!r}: {str(e)}")
+
+    content = '\x1f'.join(str(row[field] or '') for field in
+                          ('title', 'description', 'date', 'class_id', 'rrule', 'exdates'))
+    row['canvas_hash'] = hashlib.sha256(content.encode()).hexdigest()
+    # Feeds without UIDs fall back to a key that only changes with title and date
+    row['canvas_uid'] = event_data.get('uid') or 'nouid-' + hashlib.sha1(
+        f'{title}\x1f{date.isoformat()}'.encode()).hexdigest()
+    return row
+
+class CanvasEventSync:
+    """
+    Diffs a user's Canvas feed against their stored Canvas events, keyed
+    by iCal UID. Feed the events in chunks with apply(), then call
+    finish() to delete events that are no longer in the feed. Only rows
+    that were added, changed or removed are written.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.added = 0
+        self.updated = 0
+        self.deleted = 0
+        self.seen = set()
+        # uid -> (id, content hash) of everything imported before
+        self.stored = {uid: (event_id, content_hash) for uid, event_id, content_hash in
+                       db.session.query(Event.canvas_uid, Event.id, Event.canvas_hash)
+                       .filter(Event.user_id == user.id, Event.canvas_uid.isnot(None))}
+
+    @property
+    def changed(self):
+        return bool(self.added or self.updated or self.deleted)
+
+    def apply(self, events, class_ids=None):
+        class_ids = class_ids or {}
+        rows = []
+        for event_data in events:
+            row = canvas_event_row(event_data, self.user, class_ids)
+            if row['canvas_uid'] not in self.seen:
+                self.seen.add(row['canvas_uid'])
+                rows.append(row)
+        if not rows:
+            return
+
+        # Events imported before UIDs were stored are adopted by (title, date)
+        legacy = {}
+        new_rows = [row for row in rows if row['canvas_uid'] not in self.stored]
+        if new_rows:
+            dates = [row['date'] for row in new_rows]
+            legacy = {(title, date): event_id for title, date, event_id in
+                      db.session.query(Event.title, Event.date, Event.id).filter(
+                          Event.user_id == self.user.id,
+                          Event.canvas_uid.is_(None),
+                          Event.date >= min(dates),
+                          Event.date <= max(dates))}
+
+        inserts = []
+        updates = []
+        for row in rows:
+            if row['canvas_uid'] in self.stored:
+                event_id, content_hash = self.stored[row['canvas_uid']]
+                if content_hash != row['canvas_hash']:
+                    updates.append(dict(row, id=event_id))
+            elif (row['title'], row['date']) in legacy:
+                updates.append(dict(row, id=legacy.pop((row['title'], row['date']))))
+            else:
+                inserts.append(row)
+
+        if inserts:
+            db.session.execute(insert(Event), inserts)
+        if updates:
+            # ORM bulk UPDATE by primary key, as one executemany
+            db.session.execute(update(Event), updates)
+        self.added += len(inserts)
+        self.updated += len(updates)
+
+    def finish(self):
+        """Delete stored events missing from the feed and bump the calendar version."""
+        if self.seen:
+            stale = [event_id for uid, (event_id, _) in self.stored.items() if uid not in self.seen]
+            if stale:
+                Event.query.filter(Event.id.in_(stale)).delete(synchronize_session=False)
+            self.deleted = len(stale)
+        else:
+            # An empty feed is more likely a Canvas hiccup than a cleared calendar
+            logging.warning(f"Canvas feed for user {self.user.id} has no events; keeping existing ones")
+
+        if self.changed:
+            bump_calendar_version(self.user.id)
+        return self
+
+def sync_canvas_events(events, user, class_ids=None):
+    """Diff a complete list of feed events against the user's Canvas events."""
+    sync = CanvasEventSync(user)
+    sync.apply(events, class_ids)
+    return sync.finish()
+
 def process_canvas_events(events, user):
-    for event_data in events:
-        existing_event = Event.query.filter_by(
-            title=event_data['title'],
-            date=event_data['date'],
-            user_id=user.id
-        ).first()
-        
-        if not existing_event:
-            event = Event(
-                title=event_data['title'],
-                description=event_data.get('description', ''),
-                date=event_data['date'],
-                user_id=user.id
-            )
-            db.session.add(event)
-    
+    sync_canvas_events(events, user)
     try:
         db.session.commit()
     except Exception as e:
@@ -108,64 +450,66 @@ def extract_course_name(text):
     logging.debug("No valid course code found")
     return None
 
+def insert_ignore(table):
+    """INSERT that skips rows conflicting with an existing key."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql_insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with('IGNORE')
+
+def enroll_canvas_courses(course_names, user):
+    """
+    Create missing classes and enroll the user. Classes are resolved with
+    one IN query, missing ones created in one INSERT, and enrollments
+    written straight to user_classes without loading any roster.
+    Returns {course name: class id}.
+    """
+    course_names = sorted(course_names)
+    if not course_names:
+        return {}
+
+    classes = {}
+    rows = (db.session.query(Class.name, Class.id)
+            .filter(Class.name.in_(course_names))
+            .order_by(Class.id))
+    for name, class_id in rows:
+        classes.setdefault(name, class_id)
+
+    missing = [name for name in course_names if name not in classes]
+    if missing:
+        created = db.session.execute(
+            insert(Class).returning(Class.name, Class.id, sort_by_parameter_order=True),
+            [{'name': name,
+              'color': f"#{random.randint(0, 0xFFFFFF):06x}",
+              'archived': False} for name in missing]
+        )
+        classes.update(created.all())
+
+    db.session.execute(
+        insert_ignore(user_classes),
+        [{'user_id': user.id, 'class_id': class_id} for class_id in classes.values()]
+    )
+    db.session.expire(user, ['classes'])
+    return classes
+
 def fetch_canvas_courses(ical_url, user):
     if not ical_url:
         return False
         
     try:
         logging.info(f"Fetching Canvas calendar for user {user.id}")
-        response = requests.get(ical_url)
-        
-        if response.status_code != 200:
-            logging.error(f"Canvas URL returned {response.status_code}")
+        download = download_canvas_feed(ical_url)
+        if download is None:
             return False
         
-        # Parse the calendar data
-        cal = Calendar.from_ical(response.content)
-        course_names = set()
-        
-        # First pass: collect unique course codes
-        for component in cal.walk():
-            if component.name == "VEVENT":
-                summary = str(component.get('summary', 'No Title'))
-                description = str(component.get('description', ''))
-                
-                # Try to find course name in various places
-                course_name = None
-                
-                # Check description first (usually more reliable)
-                if 'Course:' in description:
-                    course_section = description.split('Course:')[1].split('\n')[0].strip()
-                    course_name = extract_course_name(course_section)
-                
-                # If not found in description, try summary
-                if not course_name:
-                    match = re.search(r'\[(.*?)\]', summary)
-                    if match:
-                        course_name = match.group(1).strip()
-                
-                if course_name:
-                    course_names.add(course_name)
-        
+        course_names = {e['course'] for e in iter_canvas_events(download.content) if e['course']}
         if not course_names:
             logging.warning("No valid courses found in calendar")
             return False
             
-        # Create or update classes
-        with db.session.no_autoflush:
-            for course_name in course_names:
-                existing_class = Class.query.filter_by(name=course_name).first()
-                if existing_class:
-                    if user not in existing_class.students:
-                        existing_class.students.append(user)
-                else:
-                    new_class = Class(
-                        name=course_name,
-                        color=f"#{random.randint(0, 0xFFFFFF):06x}"
-                    )
-                    db.session.add(new_class)
-                    new_class.students.append(user)
-        
+        enroll_canvas_courses(course_names, user)
         db.session.commit()
         return True
         
@@ -175,14 +519,11 @@ def fetch_canvas_courses(ical_url, user):
         return False
 
 def extract_course_names(ical_data):
-    cal = Calendar.from_ical(ical_data)
     courses = set()
-    for component in cal.walk():
-        if component.name == "VEVENT":
-            summary = str(component.get('summary', ''))
-            course_name = extract_course_name(summary)
-            if course_name:
-                courses.add(course_name)
+    for event in iter_vevents(ical_data):
+        course_name = extract_course_name(event['title'])
+        if course_name:
+            courses.add(course_name)
     return courses
 
 def get_canvas_events(canvas_ical_url=None):
@@ -200,9 +541,10 @@ def get_canvas_events(canvas_ical_url=None):
         canvas_ical_url = user.canvas_ical_url
 
     try:
-        response = requests.get(canvas_ical_url)
-        response.raise_for_status()
-        calendar = Calendar(response.text)
+        response = http_client.get(canvas_ical_url)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"Canvas URL returned {response.status_code}")
+        calendar = Calendar(response.content.decode('utf-8', errors='replace'))
 
         canvas_events = []
         for event in calendar.events:
@@ -222,6 +564,63 @@ def get_canvas_events(canvas_ical_url=None):
         print(f"Error fetching Canvas events: {e}")
         return []
 
+# Characters of the last message shown in the inbox
+PREVIEW_LENGTH = 200
+
+def record_message(message):
+    """
+    Fold a new message into its Conversation row: create the row if needed,
+    then set the latest message and bump the recipient's unread counter in
+    one UPDATE. Flushes the message for its id; the caller commits.
+    """
+    db.session.flush()
+    low, high = Conversation.pair(message.sender_id, message.recipient_id)
+    db.session.execute(insert_ignore(Conversation.__table__),
+                       {'user_low_id': low, 'user_high_id': high, 'unread_low': 0, 'unread_high': 0})
+
+    unread = Conversation.unread_low if message.recipient_id == low else Conversation.unread_high
+    Conversation.query.filter_by(user_low_id=low, user_high_id=high).update({
+        Conversation.last_message_id: message.id,
+        Conversation.last_message_at: message.timestamp,
+        Conversation.last_sender_id: message.sender_id,
+        Conversation.last_preview: (message.content or '')[:PREVIEW_LENGTH],
+        unread: unread + 1
+    }, synchronize_session=False)
+    # Conversation before user, in the same order as mark_conversation_read
+    add_unread_messages(message.recipient_id, 1)
+
+def add_unread_messages(user_id, count):
+    User.query.filter_by(id=user_id).update(
+        {User.unread_messages: User.unread_messages + count}, synchronize_session=False)
+
+def mark_conversation_read(user_id, other_id):
+    """
+    Mark everything `other_id` sent to `user_id` read, connection requests
+    included, and return how many were unread. The caller commits.
+    """
+    low, high = Conversation.pair(user_id, other_id)
+    unread = Conversation.unread_low if user_id == low else Conversation.unread_high
+    conversation = Conversation.query.filter_by(user_low_id=low, user_high_id=high)
+    # Lock the row first so a message arriving meanwhile is not lost from the totals
+    if conversation.with_entities(unread).with_for_update().scalar():
+        conversation.update({unread: 0}, synchronize_session=False)
+
+    count = Message.query.filter_by(
+        sender_id=other_id,
+        recipient_id=user_id,
+        status='unread'
+    ).update({'status': 'read'}, synchronize_session=False)
+    if count:
+        add_unread_messages(user_id, -count)
+    return count
+
+def unread_message_count(user_id):
+    """
+    The user's unread total, from the maintained counter: chat messages
+    plus connection requests, like the Message COUNT it replaces.
+    """
+    return db.session.query(User.unread_messages).filter(User.id == user_id).scalar() or 0
+
 def create_notification(user_id, message, notification_type='general'):
     notification = Notification(
         user_id=user_id,